@@ -6,11 +6,14 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # tifffile is optional at runtime: without it TIFFs are decoded whole by OpenCV and
+    # masks are written by Pillow without georeferencing, so bundle it when installed
+    hiddenimports=['tifffile'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Not used by the application; keeps them out of the one-file build
+    excludes=['torchvision', 'sklearn', 'scipy', 'matplotlib', 'tkinter', 'IPython', 'pandas'],
     noarchive=False,
     optimize=0,
 )
@@ -0,0 +1,106 @@
+import os
+import torch
+from PIL import Image
+from .preprocess import raster_to_input
+from .tiling import predict_tiled
+from .raster import open_raster
+from .mask_io import mask_from_probabilities, output_size
+from .geo import read_georeference
+
+IMAGE_EXTENSIONS = ('.tif', '.tiff', '.png', '.jpg', '.jpeg')
+GEO_FORMATS = ('.tif', '.tiff', '.geojson')
+
+
+def list_images(directory):
+    images = {}
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() in IMAGE_EXTENSIONS:
+            images[stem] = os.path.join(directory, name)
+    return images
+
+
+def pair_images(before_dir, after_dir):
+    before = list_images(before_dir)
+    after = list_images(after_dir)
+    names = sorted(set(before) & set(after))
+    unmatched = sorted(set(before) ^ set(after))
+    return [(name, before[name], after[name]) for name in names], unmatched
+
+
+def open_pair(before_path, after_path, scaling=None):
+    rasters = []
+    try:
+        for path in (before_path, after_path):
+            try:
+                rasters.append(open_raster(path, cache=False, scaling=scaling))
+            except Exception as e:
+                raise Exception(f"Failed to open image {path}: {str(e)}")
+        rasterA, rasterB = rasters
+        if rasterA.shape != rasterB.shape:
+            raise Exception(f"Image sizes differ: {rasterA.shape[:2]} vs {rasterB.shape[:2]}")
+    except Exception:
+        # The caller only closes pairs it gets back
+        for raster in rasters:
+            raster.close()
+        raise
+    return rasterA, rasterB
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def predict_probabilities(model, imagesA, imagesB, img_size=256, device="cpu"):
+    # Images may be RGB arrays or Raster handles; both go through the shared overview path
+    batchA = torch.cat([raster_to_input(open_raster(image), img_size, device) for image in imagesA])
+    batchB = torch.cat([raster_to_input(open_raster(image), img_size, device) for image in imagesB])
+    with torch.no_grad():
+        logits = model(batchA, batchB)
+        return torch.sigmoid(logits[:, 0]).cpu().numpy()
+
+
+def to_mask(prob_map, size=None, threshold=0.5):
+    return Image.fromarray(mask_from_probabilities(prob_map, threshold, size))
+
+
+def source_georeferences(pairs, output_format):
+    # Only the geospatial outputs carry the before image's georeferencing
+    if output_format.lower() not in GEO_FORMATS:
+        return {}
+    return {name: read_georeference(before_path) for name, before_path, _ in pairs}
+
+
+def predict_chunk(model, chunk, device="cpu", batch_size=8, img_size=256, tile_size=None, overlap=32,
+                  tile_batch_size=4, scaling=None, threshold=0.5, output_scale=1.0):
+    # Tiled pairs are read window by window from their Raster handles, tile_batch_size
+    # tiles per forward pass; the chunk's pairs otherwise share one pass
+    loaded = []
+    failed = []
+    for name, before_path, after_path in chunk:
+        try:
+            loaded.append((name,) + open_pair(before_path, after_path, scaling))
+        except Exception as e:
+            failed.append((name, str(e)))
+    if not loaded:
+        return [], failed
+
+    try:
+        if tile_size:
+            masks = []
+            for name, rasterA, rasterB in loaded:
+                prob_map = predict_tiled(model, rasterA, rasterB, tile_size=tile_size,
+                                         overlap=overlap, batch_size=tile_batch_size, device=device)
+                masks.append(to_mask(prob_map, output_size((rasterA.shape[1], rasterA.shape[0]), output_scale),
+                                     threshold))
+        else:
+            prob_maps = predict_probabilities(model, [p[1] for p in loaded], [p[2] for p in loaded],
+                                              img_size=img_size, device=device)
+            masks = [to_mask(prob_map, output_size((rasterA.shape[1], rasterA.shape[0]), output_scale), threshold)
+                     for prob_map, (_, rasterA, _) in zip(prob_maps, loaded)]
+    finally:
+        for _, rasterA, rasterB in loaded:
+            rasterA.close()
+            rasterB.close()
+    return [(name, mask) for (name, _, _), mask in zip(loaded, masks)], failed
@@ -0,0 +1,196 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+from .batch import list_images, pair_images
+from .change_detection_model import SNUNet_ECAM
+from .coarse import CoarseToFine
+from .metrics import add_confusion, confusion, scores
+from .predict import predict_changes
+from .prescreen import skipped_positive_fraction
+from .registry import model_registry, resolve_device
+from .timing import StageTimer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def time_forward(model, xA, xB, repeats=5, warmup=1):
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(xA, xB)
+        if xA.is_cuda:
+            torch.cuda.synchronize()
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(xA, xB)
+            if xA.is_cuda:
+                torch.cuda.synchronize()
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def benchmark_shared_encoder(model_path=None, device=None, img_size=256, batch_size=1, repeats=5, warmup=1):
+    device = resolve_device(device)
+    if model_path:
+        model = model_registry.get(model_path, device, optimized=False)
+    else:
+        model = SNUNet_ECAM(in_ch=3, out_ch=1).to(device).eval()
+
+    generator = torch.Generator().manual_seed(0)
+    xA = torch.randn(batch_size, 3, img_size, img_size, generator=generator).to(device)
+    xB = torch.randn(batch_size, 3, img_size, img_size, generator=generator).to(device)
+
+    shared = model.shared_encoder
+    try:
+        model.shared_encoder = False
+        with torch.no_grad():
+            reference = model(xA, xB)
+        sequential_time = time_forward(model, xA, xB, repeats, warmup)
+
+        model.shared_encoder = True
+        with torch.no_grad():
+            batched = model(xA, xB)
+        batched_time = time_forward(model, xA, xB, repeats, warmup)
+    finally:
+        model.shared_encoder = shared
+
+    return {
+        "device": device,
+        "img_size": img_size,
+        "batch_size": batch_size,
+        "sequential_seconds": sequential_time,
+        "shared_encoder_seconds": batched_time,
+        "speedup": sequential_time / batched_time if batched_time > 0 else float("inf"),
+        "max_abs_diff": (reference - batched).abs().max().item(),
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(data_dir, model_path=None, device=None, threads=None, tile_size=None, overlap=32,
+                  batch_size=4, precision="fp32", scaling=None, limit=None, warmup=1, prescreen=None,
+                  log=print):
+    device = resolve_device(device)
+    if threads:
+        torch.set_num_threads(threads)
+
+    pairs, _ = pair_images(os.path.join(data_dir, "before"), os.path.join(data_dir, "after"))
+    labels = list_images(os.path.join(data_dir, "label"))
+    pairs = [pair for pair in pairs if pair[0] in labels]
+    if limit:
+        pairs = pairs[:limit]
+    if not pairs:
+        raise Exception(f"No labelled before/after pairs found under {data_dir}")
+
+    # A TilePrescreen or CoarseToFine only applies to tiled runs
+    screen = prescreen if tile_size else None
+    options = dict(model_path=model_path, device=device, tile_size=tile_size, overlap=overlap,
+                   batch_size=batch_size, precision=precision, scaling=scaling, prescreen=screen)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_path = os.path.join(output_dir, "result.png")
+        for name, before_path, after_path in pairs[:warmup]:
+            predict_changes(before_path, after_path, output_path=output_path, **options)
+
+        timer = StageTimer()
+        totals = {}
+        per_pair = []
+        skipped = {"tiles": 0, "skipped": 0, "positives": 0, "lost": 0}
+        start = time.perf_counter()
+        for name, before_path, after_path in pairs:
+            pair_timer = StageTimer()
+            if screen is not None:
+                screen.reset()
+            pair_start = time.perf_counter()
+            mask = predict_changes(before_path, after_path, output_path=output_path, timer=pair_timer, **options)
+            seconds = time.perf_counter() - pair_start
+
+            label = np.asarray(Image.open(labels[name]).convert("L"))
+            extra = {}
+            if screen is not None:
+                lost_fraction, lost = skipped_positive_fraction(label, screen.skipped_windows, mask.shape)
+                skipped["tiles"] += screen.total
+                skipped["skipped"] += screen.skipped
+                skipped["positives"] += int((label > 0).sum())
+                skipped["lost"] += lost
+                extra = dict(tiles=screen.total, skipped_tiles=screen.skipped, recall_lost=lost_fraction)
+            if mask.shape != label.shape:
+                mask = cv2.resize(mask, (label.shape[1], label.shape[0]), interpolation=cv2.INTER_NEAREST)
+            counts = confusion(mask, label)
+            add_confusion(totals, counts)
+            timer.merge(pair_timer)
+            per_pair.append(dict(name=name, seconds=seconds, **scores(counts), **extra))
+            log(f"{name}: {seconds * 1000:.0f} ms")
+        elapsed = time.perf_counter() - start
+
+    return {
+        "revision": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": dict(options, model_path=model_path and os.path.abspath(model_path),
+                         scaling=scaling.key() if scaling else None, prescreen=screen and screen.key(),
+                         threads=torch.get_num_threads(), data_dir=os.path.abspath(data_dir),
+                         warmup=warmup),
+        "pairs": len(pairs),
+        "seconds": elapsed,
+        "pairs_per_second": len(pairs) / elapsed if elapsed > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "metrics": dict(scores(totals), **totals),
+        "stages": timer.summary(),
+        "prescreen": prescreen_summary(screen, skipped),
+        "per_pair": per_pair,
+    }
+
+
+def prescreen_summary(screen, skipped):
+    if screen is None:
+        return None
+    return {
+        "mode": "coarse-to-fine" if isinstance(screen, CoarseToFine) else "pre-screen",
+        "threshold": screen.threshold,
+        "settings": list(screen.key()),
+        "tiles": skipped["tiles"],
+        "skipped_tiles": skipped["skipped"],
+        "skipped_fraction": skipped["skipped"] / skipped["tiles"] if skipped["tiles"] else 0.0,
+        "lost_positive_pixels": skipped["lost"],
+        # Upper bound: labelled change inside skipped tiles, whether or not the model would have found it
+        "recall_lost": skipped["lost"] / skipped["positives"] if skipped["positives"] else 0.0,
+    }
+
+
+def write_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
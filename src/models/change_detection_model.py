@@ -48,9 +48,11 @@ class ChannelAttention(nn.Module):
         self.fc2 = nn.Conv2d(in_channels//ratio, in_channels,1,bias=False)
         self.sigmod = nn.Sigmoid()
     def forward(self,x):
-        avg_out = self.fc2(self.relu1(self.fc1(self.avg_pool(x))))
-        max_out = self.fc2(self.relu1(self.fc1(self.max_pool(x))))
-        out = avg_out + max_out
+        # both pooled descriptors share fc1/fc2, so push them through as one batch
+        n = x.size(0)
+        pooled = torch.cat([self.avg_pool(x), self.max_pool(x)], 0)
+        out = self.fc2(self.relu1(self.fc1(pooled)))
+        out = out[:n] + out[n:]
         return self.sigmod(out)
 
 
@@ -60,6 +62,7 @@ class SNUNet_ECAM(nn.Module):
     def __init__(self, in_ch=3, out_ch=2):
         super(SNUNet_ECAM, self).__init__()
         torch.nn.Module.dump_patches = True
+        self.shared_encoder = True
         n1 = 32     # the initial number of channels of feature map
         filters = [n1, n1 * 2, n1 * 4, n1 * 8, n1 * 16]
 
@@ -108,18 +111,28 @@ class SNUNet_ECAM(nn.Module):
                 nn.init.constant_(m.bias, 0)
 
 
+    def encode(self, x):
+        # Shared encoder; features of a fixed baseline image can be computed once and reused
+        x0_0 = self.conv0_0(x)
+        x1_0 = self.conv1_0(self.pool(x0_0))
+        x2_0 = self.conv2_0(self.pool(x1_0))
+        x3_0 = self.conv3_0(self.pool(x2_0))
+        return [x0_0, x1_0, x2_0, x3_0]
+
     def forward(self, xA, xB):
-        '''xA'''
-        x0_0A = self.conv0_0(xA)
-        x1_0A = self.conv1_0(self.pool(x0_0A))
-        x2_0A = self.conv2_0(self.pool(x1_0A))
-        x3_0A = self.conv3_0(self.pool(x2_0A))
-        # x4_0A = self.conv4_0(self.pool(x3_0A))
-        '''xB'''
-        x0_0B = self.conv0_0(xB)
-        x1_0B = self.conv1_0(self.pool(x0_0B))
-        x2_0B = self.conv2_0(self.pool(x1_0B))
-        x3_0B = self.conv3_0(self.pool(x2_0B))
+        if self.shared_encoder and not self.training:
+            # A and B go through the shared encoder as one batch; BatchNorm uses
+            # running stats in eval mode, so this matches two separate passes.
+            n = xA.size(0)
+            features = self.encode(torch.cat([xA, xB], 0))
+            return self.decode([f[:n] for f in features], [f[n:] for f in features])
+        return self.decode(self.encode(xA), self.encode(xB))
+
+    def decode(self, featuresA, featuresB):
+        # Fuses the encoder features of both dates into change logits
+        x0_0A, x1_0A, x2_0A, x3_0A = featuresA
+        x0_0B, x1_0B, x2_0B, x3_0B = featuresB
+        # conv4_0 is only consumed on the B side
         x4_0B = self.conv4_0(self.pool(x3_0B))
 
         x0_1 = self.conv0_1(torch.cat([x0_0A, x0_0B, self.Up1_0(x1_0B)], 1))
@@ -0,0 +1,483 @@
+import argparse
+import os
+import sys
+
+
+def add_scaling_arguments(parser):
+    parser.add_argument("--scaling", choices=["minmax", "percentile", "bitdepth"], default="minmax",
+                        help="How non-8-bit imagery is stretched to 0..255")
+    parser.add_argument("--percentiles", type=float, nargs=2, default=(2.0, 98.0), metavar=("LOW", "HIGH"),
+                        help="Stretch limits for --scaling percentile")
+    parser.add_argument("--bit-depth", type=int, default=16, help="Sensor bit depth for --scaling bitdepth")
+
+
+def scaling_from_args(args):
+    from .radiometry import Scaling
+
+    return Scaling(args.scaling, args.percentiles[0], args.percentiles[1], args.bit_depth)
+
+
+def add_screening_arguments(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--prescreen", type=float, default=None,
+                       help="Skip tiles whose before/after difference score is below this; "
+                            "~1.5 is conservative, 2.0 aggressive")
+    group.add_argument("--coarse", type=float, default=None, metavar="THRESHOLD",
+                       help="Two-stage run: only refine tiles where a low-resolution pass reaches this probability")
+    parser.add_argument("--coarse-size", type=int, default=512, help="Longer side of the low-resolution pass")
+    parser.add_argument("--coarse-margin", type=int, default=64,
+                        help="Dilation of the coarse detections, in source pixels, before selecting tiles")
+
+
+def screen_from_args(args):
+    if args.coarse is not None:
+        from .coarse import CoarseToFine
+
+        return CoarseToFine(args.coarse, args.coarse_size, args.coarse_margin)
+    if args.prescreen is not None:
+        from .prescreen import TilePrescreen
+
+        return TilePrescreen(args.prescreen)
+    return None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m models",
+        description="Headless building change detection (SNUNet_ECAM)",
+    )
+    parser.add_argument("--profile", default=None, metavar="TRACE",
+                        help="Record per-layer, per-stage and torch.cat timings of in-process work "
+                             "to this Chrome trace JSON and print a summary")
+    parser.add_argument("--profile-top", type=int, default=30, help="Rows in the profile summary")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    batch = subparsers.add_parser("batch", help="Run detection over paired before/after directories")
+    batch.add_argument("--before", required=True, help="Directory with before images")
+    batch.add_argument("--after", required=True, help="Directory with after images (paired by file name)")
+    batch.add_argument("--output", required=True, help="Directory to write change masks to")
+    batch.add_argument("--model", default=None, help="Model weights (.pth); defaults to model/model.pth")
+    batch.add_argument("--device", default=None, help="cpu or cuda; auto-detected by default")
+    batch.add_argument("--batch-size", type=int, default=8,
+                       help="Pairs per forward pass (per worker chunk with --workers)")
+    batch.add_argument("--tile-batch-size", type=int, default=4, help="Tiles per forward pass with --tile-size")
+    batch.add_argument("--tile-size", type=int, default=None,
+                       help="Run tiled inference at native resolution with this tile size")
+    batch.add_argument("--overlap", type=int, default=32, help="Tile overlap in pixels")
+    batch.add_argument("--precision", choices=["fp32", "int8"], default="fp32",
+                       help="int8 needs a model produced by the quantize command (CPU only)")
+    batch.add_argument("--threshold", type=float, default=0.5,
+                       help="Change probability above which a pixel is marked; recorded in the mask files")
+    batch.add_argument("--scale", type=float, default=1.0, help="Output mask size relative to the input")
+    batch.add_argument("--format", dest="output_format", choices=["png", "tif", "rle", "geojson"], default="png",
+                       help="Mask encoding: 1-bit PNG, tiled deflate (Geo)TIFF, run-length JSON or GeoJSON polygons")
+    batch.add_argument("--workers", type=int, default=None,
+                       help="CPU worker processes, each with its own model copy and no probability cache; "
+                            "1 runs in-process")
+    batch.add_argument("--threads", type=int, default=None,
+                       help="torch threads per worker; workers x threads defaults to the available cores")
+    batch.add_argument("--decode-threads", type=int, default=None, help="Reader threads feeding the model (default 2)")
+    batch.add_argument("--write-threads", type=int, default=None, help="Threads encoding and writing masks (default 2)")
+    batch.add_argument("--queue-size", type=int, default=None,
+                       help="Bound on decoded and predicted items in flight; 2x batch size by default")
+    batch.add_argument("--cache-dir", default=None,
+                       help="Probability map cache; defaults to cache/probabilities next to the app")
+    batch.add_argument("--cache-size", type=float, default=None, help="Cache size limit in GB (default 2)")
+    batch.add_argument("--no-cache", action="store_true", help="Always run the model")
+    add_scaling_arguments(batch)
+    batch.set_defaults(func=run_batch_command)
+
+    detect = subparsers.add_parser("detect", help="Tiled detection of one scene into a georeferenced GeoTIFF mask")
+    detect.add_argument("before", help="Before image (GeoTIFF georeferencing is carried over)")
+    detect.add_argument("after", help="After image")
+    detect.add_argument("--output", required=True, help="Mask GeoTIFF to write (.tif)")
+    detect.add_argument("--vector", default=None, help="Also write changed regions as GeoJSON polygons")
+    detect.add_argument("--min-area", type=int, default=0, help="Drop regions smaller than this many pixels")
+    detect.add_argument("--simplify", type=float, default=0.0, help="Polygon simplification tolerance in pixels")
+    detect.add_argument("--model", default=None, help="Model weights (.pth); defaults to model/model.pth")
+    detect.add_argument("--device", default=None, help="cpu or cuda; auto-detected by default")
+    detect.add_argument("--tile-size", type=int, default=512)
+    detect.add_argument("--overlap", type=int, default=32)
+    detect.add_argument("--batch-size", type=int, default=4)
+    detect.add_argument("--precision", choices=["fp32", "int8"], default="fp32")
+    detect.add_argument("--threshold", type=float, default=0.5)
+    add_screening_arguments(detect)
+    add_scaling_arguments(detect)
+    detect.set_defaults(func=run_detect_command)
+
+    monitor = subparsers.add_parser("monitor", help="Compare one baseline image against several later dates")
+    monitor.add_argument("baseline", help="Before image shared by every comparison")
+    monitor.add_argument("epochs", nargs="+", help="Later images of the same area, same size as the baseline")
+    monitor.add_argument("--output", required=True, help="Directory to write change masks to (named after each date)")
+    monitor.add_argument("--format", dest="output_format", choices=["png", "tif", "rle", "geojson"], default="png")
+    monitor.add_argument("--model", default=None, help="Model weights (.pth); defaults to model/model.pth")
+    monitor.add_argument("--device", default=None, help="cpu or cuda; auto-detected by default")
+    monitor.add_argument("--tile-size", type=int, default=256)
+    monitor.add_argument("--overlap", type=int, default=32)
+    monitor.add_argument("--batch-size", type=int, default=4)
+    monitor.add_argument("--threshold", type=float, default=0.5)
+    monitor.add_argument("--feature-cache-size", type=float, default=1.0,
+                         help="In-memory limit for baseline encoder features in GB")
+    monitor.add_argument("--feature-cache-dir", default=None,
+                         help="Also keep baseline features on disk here so later runs reuse them")
+    monitor.add_argument("--feature-disk-size", type=float, default=8.0, help="On-disk feature cache limit in GB")
+    add_scaling_arguments(monitor)
+    monitor.set_defaults(func=run_monitor_command)
+
+    bench = subparsers.add_parser("bench-forward", help="Compare the shared-encoder forward against two encoder passes")
+    bench.add_argument("--model", default=None, help="Model weights (.pth); random weights if omitted")
+    bench.add_argument("--device", default=None, help="cpu or cuda; auto-detected by default")
+    bench.add_argument("--img-size", type=int, default=256)
+    bench.add_argument("--batch-size", type=int, default=1)
+    bench.add_argument("--repeats", type=int, default=5)
+    bench.set_defaults(func=run_bench_forward_command)
+
+    benchmark = subparsers.add_parser("benchmark", help="Accuracy and throughput over labelled before/after/label pairs")
+    benchmark.add_argument("--data", default="test_image", help="Directory with before/, after/ and label/")
+    benchmark.add_argument("--output", default="benchmark.json", help="JSON report path")
+    benchmark.add_argument("--model", default=None, help="Model weights (.pth); defaults to model/model.pth")
+    benchmark.add_argument("--device", default=None, help="cpu or cuda; auto-detected by default")
+    benchmark.add_argument("--threads", type=int, default=None, help="torch.set_num_threads value")
+    benchmark.add_argument("--tile-size", type=int, default=None)
+    benchmark.add_argument("--overlap", type=int, default=32)
+    benchmark.add_argument("--batch-size", type=int, default=4)
+    benchmark.add_argument("--precision", choices=["fp32", "int8"], default="fp32")
+    benchmark.add_argument("--limit", type=int, default=None, help="Only use the first N pairs")
+    benchmark.add_argument("--warmup", type=int, default=1, help="Untimed pairs run first")
+    add_screening_arguments(benchmark)
+    add_scaling_arguments(benchmark)
+    benchmark.set_defaults(func=run_benchmark_command)
+
+    export = subparsers.add_parser("export", help="Fuse conv+BN and write TorchScript/ONNX next to the weights")
+    export.add_argument("model", help="Model weights (.pth)")
+    export.add_argument("--format", dest="formats", action="append", choices=["torchscript", "onnx"],
+                        help="Artifact to write (repeatable); both by default")
+    export.add_argument("--img-size", type=int, default=256, help="Example input size used for tracing")
+    export.set_defaults(func=run_export_command)
+
+    quantize = subparsers.add_parser("quantize", help="Post-training static INT8 quantization for CPU inference")
+    quantize.add_argument("model", help="Model weights (.pth)")
+    quantize.add_argument("--before", required=True, help="Calibration before images")
+    quantize.add_argument("--after", required=True, help="Calibration after images")
+    quantize.add_argument("--labels", default=None, help="Label masks; reports the accuracy delta against fp32")
+    quantize.add_argument("--max-pairs", type=int, default=32, help="Number of calibration pairs")
+    quantize.add_argument("--batch-size", type=int, default=4)
+    quantize.set_defaults(func=run_quantize_command)
+
+    serve = subparsers.add_parser("serve", help="Local HTTP service that keeps the model loaded and micro-batches requests")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--model", default=None, help="Model weights (.pth); defaults to model/model.pth")
+    serve.add_argument("--device", default=None, help="cpu or cuda; auto-detected by default")
+    serve.add_argument("--precision", choices=["fp32", "int8"], default="fp32")
+    serve.add_argument("--max-batch", type=int, default=8, help="Largest number of requests run in one forward pass")
+    serve.add_argument("--max-latency-ms", type=float, default=10.0,
+                       help="How long the first request of a batch waits for others to join")
+    serve.add_argument("--threads", type=int, default=None, help="torch.set_num_threads value")
+    serve.add_argument("--verbose", action="store_true", help="Log every request")
+    add_scaling_arguments(serve)
+    serve.set_defaults(func=run_serve_command)
+
+    startup = subparsers.add_parser("startup", help="Check the GUI's import time against a budget")
+    startup.add_argument("--budget", type=float, default=1.0, help="Allowed import time in seconds")
+    startup.add_argument("--module", default="ui.main_window", help="Module imported before the window shows")
+    startup.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    startup.set_defaults(func=run_startup_command)
+
+    return parser
+
+
+def run_batch_command(args):
+    from .batch import pair_images
+
+    pairs, unmatched = pair_images(args.before, args.after)
+    if unmatched:
+        print(f"{len(unmatched)} file(s) without a counterpart were ignored: {', '.join(unmatched[:10])}")
+    if not pairs:
+        print("No image pairs found.")
+        return 1
+
+    if args.workers is not None and args.workers > 1:
+        from .pool import run_pool
+
+        # Workers run on the CPU and write their own masks, outside the in-process pipeline
+        unsupported = [flag for flag, given in (
+            ("--device", args.device not in (None, "cpu")),
+            ("--cache-dir", args.cache_dir is not None),
+            ("--cache-size", args.cache_size is not None),
+            ("--decode-threads", args.decode_threads is not None),
+            ("--write-threads", args.write_threads is not None),
+            ("--queue-size", args.queue_size is not None),
+        ) if given]
+        if unsupported:
+            print(f"{', '.join(unsupported)} cannot be combined with --workers; use --workers 1")
+            return 1
+
+        stats = run_pool(
+            pairs, args.output,
+            model_path=args.model,
+            workers=args.workers,
+            threads=args.threads,
+            batch_size=args.batch_size,
+            tile_size=args.tile_size,
+            overlap=args.overlap,
+            tile_batch_size=args.tile_batch_size,
+            precision=args.precision,
+            scaling=scaling_from_args(args),
+            threshold=args.threshold,
+            output_scale=args.scale,
+            output_format="." + args.output_format,
+        )
+    else:
+        from .pipeline import run_pipeline
+        from .probability_cache import ProbabilityCache
+
+        if args.threads:
+            import torch
+
+            torch.set_num_threads(args.threads)
+        stats = run_pipeline(
+            pairs, args.output,
+            model_path=args.model,
+            device=args.device,
+            batch_size=args.batch_size,
+            tile_size=args.tile_size,
+            overlap=args.overlap,
+            tile_batch_size=args.tile_batch_size,
+            precision=args.precision,
+            scaling=scaling_from_args(args),
+            decode_threads=args.decode_threads or 2,
+            write_threads=args.write_threads or 2,
+            queue_size=args.queue_size,
+            threshold=args.threshold,
+            output_scale=args.scale,
+            output_format="." + args.output_format,
+            cache=None if args.no_cache else ProbabilityCache(args.cache_dir,
+                                                              int((args.cache_size or 2.0) * (1 << 30))),
+        )
+    print(f"Processed {stats['pairs']} pairs in {stats['seconds']:.2f}s "
+          f"({stats['pairs_per_second']:.2f} pairs/s), {len(stats['failed'])} failed")
+    if stats.get("cache_hits"):
+        print(f"  {stats['cache_hits']} pairs served from the probability cache")
+    for stage, seconds in stats.get("busy_seconds", {}).items():
+        print(f"  {stage:10}busy {seconds:8.2f}s")
+    for name, queue in stats.get("queues", {}).items():
+        print(f"  {name:10}depth {queue['mean_depth']:5.1f} avg / {queue['max_depth']} max of {queue['capacity']}, "
+              f"producer stalled {queue['put_stall_seconds']:.2f}s, consumer stalled {queue['get_stall_seconds']:.2f}s")
+    return 1 if stats['failed'] else 0
+
+
+def run_detect_command(args):
+    from .geo import vectorize_mask, write_geojson
+    from .predict import predict_to_geotiff
+    prescreen = screen_from_args(args)
+    mask, georef = predict_to_geotiff(
+        args.before, args.after, args.output,
+        model_path=args.model,
+        device=args.device,
+        tile_size=args.tile_size,
+        overlap=args.overlap,
+        batch_size=args.batch_size,
+        precision=args.precision,
+        scaling=scaling_from_args(args),
+        threshold=args.threshold,
+        keep_mask=bool(args.vector),
+        prescreen=prescreen,
+    )
+    print(f"Mask written to {args.output}" + ("" if georef is not None else " (input is not georeferenced)"))
+    if prescreen is not None:
+        print(f"Skipped {prescreen.skipped}/{prescreen.total} full-resolution tiles "
+              f"({prescreen.skipped_fraction():.1%})")
+    if args.vector:
+        features = vectorize_mask(mask, georef, min_area=args.min_area, simplify=args.simplify)
+        stats = write_geojson(features, args.vector, georef, args.threshold)
+        unit = "map units^2" if georef is not None and georef.transform is not None else "pixels"
+        print(f"{stats['regions']} regions, total area {stats['total_area']:.1f} {unit} "
+              f"(mean {stats['mean_area']:.1f}, max {stats['max_area']:.1f}) -> {args.vector}")
+    return 0
+
+
+def run_monitor_command(args):
+    import time
+    from .feature_cache import FeatureCache
+    from .geo import read_georeference
+    from .mask_io import save_mask
+    from .predict import predict_changes
+
+    features = FeatureCache(int(args.feature_cache_size * (1 << 30)), args.feature_cache_dir,
+                            int(args.feature_disk_size * (1 << 30)))
+    georef = read_georeference(args.baseline) if args.output_format in ("tif", "geojson") else None
+    failed = 0
+    for epoch in args.epochs:
+        name = os.path.splitext(os.path.basename(epoch))[0]
+        output_path = os.path.join(args.output, f"{name}.{args.output_format}")
+        hits, start = features.hits, time.perf_counter()
+        try:
+            mask = predict_changes(
+                args.baseline, epoch,
+                model_path=args.model,
+                device=args.device,
+                tile_size=args.tile_size,
+                overlap=args.overlap,
+                batch_size=args.batch_size,
+                scaling=scaling_from_args(args),
+                threshold=args.threshold,
+                features=features,
+            )
+            save_mask(mask, output_path, args.threshold, georef)
+        except Exception as e:
+            print(f"{name}: {e}")
+            failed += 1
+            continue
+        print(f"{name}: {time.perf_counter() - start:.2f}s, "
+              f"{features.hits - hits} baseline tiles reused -> {output_path}")
+    print(f"Baseline features held in memory: {features.memory_bytes() / 2 ** 20:.0f} MB")
+    return 1 if failed else 0
+
+
+def run_bench_forward_command(args):
+    from .benchmark import benchmark_shared_encoder
+
+    stats = benchmark_shared_encoder(
+        model_path=args.model,
+        device=args.device,
+        img_size=args.img_size,
+        batch_size=args.batch_size,
+        repeats=args.repeats,
+    )
+    print(f"Input {stats['batch_size']}x3x{stats['img_size']}x{stats['img_size']} on {stats['device']}")
+    print(f"  two encoder passes : {stats['sequential_seconds'] * 1000:.1f} ms")
+    print(f"  shared encoder     : {stats['shared_encoder_seconds'] * 1000:.1f} ms")
+    print(f"  speedup            : {stats['speedup']:.2f}x")
+    print(f"  max |diff|         : {stats['max_abs_diff']:.2e}")
+    return 0
+
+
+def run_benchmark_command(args):
+    from .benchmark import run_benchmark, write_report
+
+    report = run_benchmark(
+        args.data,
+        model_path=args.model,
+        device=args.device,
+        threads=args.threads,
+        tile_size=args.tile_size,
+        overlap=args.overlap,
+        batch_size=args.batch_size,
+        precision=args.precision,
+        scaling=scaling_from_args(args),
+        limit=args.limit,
+        warmup=args.warmup,
+        prescreen=screen_from_args(args),
+    )
+    write_report(report, args.output)
+
+    metrics = report["metrics"]
+    print(f"{report['pairs']} pairs, {report['pairs_per_second']:.2f} pairs/s, "
+          f"peak RSS {report['peak_rss_mb'] or 0:.0f} MB")
+    print(f"precision {metrics['precision']:.4f}  recall {metrics['recall']:.4f}  "
+          f"f1 {metrics['f1']:.4f}  iou {metrics['iou']:.4f}")
+    for name, stage in report["stages"].items():
+        print(f"  {name:12}{stage['mean_ms']:10.1f} ms x {stage['calls']}")
+    screen = report["prescreen"]
+    if screen is not None:
+        print(f"{screen['mode']} {screen['threshold']:g}: skipped {screen['skipped_tiles']}/{screen['tiles']} tiles "
+              f"({screen['skipped_fraction']:.1%}), estimated recall lost <= {screen['recall_lost']:.2%}")
+    print(f"Report written to {args.output}")
+    return 0
+
+
+def run_export_command(args):
+    from .export import export_model
+
+    written = export_model(args.model, formats=args.formats or ("torchscript", "onnx"), img_size=args.img_size)
+    for kind, info in written.items():
+        line = f"{kind}: {info['path']}"
+        if "max_abs_diff" in info:
+            line += f" (max |diff| vs .pth: {info['max_abs_diff']:.2e})"
+        print(line)
+    return 0
+
+
+def run_quantize_command(args):
+    from .batch import pair_images
+    from .quantize import compare_precisions, quantize_model
+
+    pairs, _ = pair_images(args.before, args.after)
+    path = quantize_model(args.model, pairs, batch_size=args.batch_size, max_pairs=args.max_pairs)
+    print(f"int8: {path}")
+
+    if args.labels:
+        report = compare_precisions(args.model, pairs, args.labels, batch_size=args.batch_size)
+        print(f"{'':6}{'precision':>10}{'recall':>10}{'f1':>10}{'iou':>10}{'s/pair':>10}")
+        for name in ("fp32", "int8"):
+            row = report[name]
+            print(f"{name:6}{row['precision']:10.4f}{row['recall']:10.4f}{row['f1']:10.4f}{row['iou']:10.4f}"
+                  f"{row['seconds_per_pair']:10.3f}")
+        delta = report["delta"]
+        print(f"{'delta':6}{delta['precision']:+10.4f}{delta['recall']:+10.4f}{delta['f1']:+10.4f}"
+              f"{delta['iou']:+10.4f}")
+        print(f"speedup {report['speedup']:.2f}x, size {report['size_mb']['fp32']:.1f} MB -> "
+              f"{report['size_mb']['int8']:.1f} MB")
+    return 0
+
+
+def run_serve_command(args):
+    from .server import DetectionServer
+
+    if args.threads:
+        import torch
+
+        torch.set_num_threads(args.threads)
+    server = DetectionServer(
+        (args.host, args.port),
+        model_path=args.model,
+        device=args.device,
+        precision=args.precision,
+        max_batch=args.max_batch,
+        max_latency=args.max_latency_ms / 1000,
+        scaling=scaling_from_args(args),
+        verbose=args.verbose,
+    )
+    server.load()
+    host, port = server.server_address[:2]
+    print(f"Serving on http://{host}:{port} (POST /predict, GET /metrics, GET /health); Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+def run_startup_command(args):
+    from .startup import measure_imports, within_budget
+
+    report = measure_imports(args.module)
+    print(f"import {report['module']}: {report['seconds'] * 1000:.0f} ms (budget {args.budget * 1000:.0f} ms)")
+    for name, seconds in report["slowest"][:args.top]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+    if report["heavy"]:
+        print(f"Imported eagerly, should load in the background: {', '.join(report['heavy'])}")
+    return 0 if within_budget(report, args.budget) else 1
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.profile:
+        return args.func(args)
+
+    from .profiling import Profiler
+
+    with Profiler() as profiler:
+        code = args.func(args)
+    profiler.write_trace(args.profile)
+    print(profiler.format_summary(args.profile_top))
+    print(f"Trace written to {args.profile} (open in ui.perfetto.dev or chrome://tracing)")
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
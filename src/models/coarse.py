@@ -0,0 +1,82 @@
+import math
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+from .preprocess import to_input_tensor
+from .prescreen import TilePrescreen
+
+
+def coarse_shape(h, w, size):
+    # Whole-scene input whose longer side is at most size, in multiples of 16
+    scale = min(1.0, size / max(h, w))
+    return max(16, round(h * scale / 16) * 16), max(16, round(w * scale / 16) * 16)
+
+
+class CoarseToFine(TilePrescreen):
+    # Two-stage inference: the whole scene runs once at low resolution, then only tiles
+    # where the coarse probability, dilated by margin source pixels, reaches threshold are
+    # refined at full resolution. Skipped tiles keep the upsampled coarse prediction.
+    stage = "refine"
+
+    def __init__(self, threshold=0.2, size=512, margin=64):
+        super().__init__(threshold)
+        self.size = size
+        self.margin = margin
+        self.shape = None
+        self.coarse = None
+        self.logits = None
+        self.dilated = None
+
+    def prepare(self, model, imgA, imgB, device, timer):
+        h, w = imgA.shape[:2]
+        ch, cw = coarse_shape(h, w, self.size)
+        with timer.stage("coarse"):
+            factor = max(1, min(h // ch, w // cw))
+            tensors = []
+            for image in (imgA, imgB):
+                image = image.read_overview(factor) if hasattr(image, "read_overview") else np.asarray(image)
+                tensor = to_input_tensor(image, device)
+                tensors.append(F.interpolate(tensor, size=(ch, cw), mode="bilinear",
+                                             align_corners=False, antialias=True))
+            with torch.no_grad():
+                logits = model(*tensors)[0, 0].float().cpu()
+            self.shape = (h, w)
+            self.logits = logits.numpy()
+            self.coarse = torch.sigmoid(logits).numpy()
+            radius = math.ceil(self.margin * max(ch / h, cw / w))
+            kernel = np.ones((2 * radius + 1, 2 * radius + 1), dtype=np.uint8)
+            self.dilated = cv2.dilate(self.coarse, kernel) if radius else self.coarse
+
+    def _coarse_window(self, window):
+        y0, y1, x0, x1 = window
+        h, w = self.shape
+        ch, cw = self.coarse.shape
+        cy0, cx0 = y0 * ch // h, x0 * cw // w
+        return cy0, max(cy0 + 1, -(-y1 * ch // h)), cx0, max(cx0 + 1, -(-x1 * cw // w))
+
+    def scores(self, tiles_a, tiles_b, windows):
+        scores = np.empty(len(windows), dtype=np.float32)
+        for i, window in enumerate(windows):
+            cy0, cy1, cx0, cx1 = self._coarse_window(window)
+            scores[i] = self.dilated[cy0:cy1, cx0:cx1].max()
+        return scores
+
+    def fill(self, windows, tile_size):
+        # Bilinear upsampling of the coarse logits, sampled at each tile's source pixels
+        h, w = self.shape
+        ch, cw = self.logits.shape
+        logits = np.empty((len(windows), tile_size, tile_size), dtype=np.float32)
+        for i, (y0, y1, x0, x1) in enumerate(windows):
+            ys = (np.arange(y0, y0 + tile_size, dtype=np.float32) + 0.5) * (ch / h) - 0.5
+            xs = (np.arange(x0, x0 + tile_size, dtype=np.float32) + 0.5) * (cw / w) - 0.5
+            map_x, map_y = np.meshgrid(xs, ys)
+            logits[i] = cv2.remap(self.logits, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return logits
+
+    def reset(self):
+        super().reset()
+        self.shape = self.coarse = self.logits = self.dilated = None
+
+    def key(self):
+        return ("coarse", self.threshold, self.size, self.margin)
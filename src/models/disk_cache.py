@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def payload_key(payload, digest_size=20):
+    # Cache key of a JSON-serializable description of an entry
+    return hashlib.blake2b(json.dumps(payload, sort_keys=True).encode(), digest_size=digest_size).hexdigest()
+
+
+def atomic_write(path, write):
+    # write(f) fills a temporary file that then replaces path, so concurrent readers and
+    # other processes never see a partly written entry
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DiskIndex:
+    # Files with one suffix under a directory, least recently used first, with their
+    # total size. The directory is walked once; adds, hits and removals keep the index
+    # and the running total up to date after that.
+    def __init__(self, directory, suffix):
+        self.directory = directory
+        self.suffix = suffix
+        self._paths = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _index(self):
+        if self._paths is None:
+            entries = []
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith(self.suffix):
+                        path = os.path.join(root, name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        entries.append((stat.st_mtime_ns, path, stat.st_size))
+            self._paths = OrderedDict((path, size) for _, path, size in sorted(entries))
+            self._bytes = sum(self._paths.values())
+        return self._paths
+
+    def __contains__(self, path):
+        with self._lock:
+            return path in self._index()
+
+    def total(self):
+        with self._lock:
+            self._index()
+            return self._bytes
+
+    def touch(self, path):
+        # The mtime carries the recency over to the next process that walks the directory
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            index = self._index()
+            if path in index:
+                index.move_to_end(path)
+
+    def add(self, path):
+        size = os.path.getsize(path)
+        with self._lock:
+            index = self._index()
+            self._bytes += size - index.get(path, 0)
+            index[path] = size
+            index.move_to_end(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        self._bytes -= self._paths.pop(path)
+
+    def evict(self, max_bytes, incoming=0, keep=None):
+        # Removes the least recently used files until incoming more bytes fit under
+        # max_bytes, never those for which keep(path) is true; returns whether they fit
+        with self._lock:
+            for path in list(self._index()):
+                if self._bytes + incoming <= max_bytes:
+                    break
+                if keep is None or not keep(path):
+                    self._remove(path)
+            return self._bytes + incoming <= max_bytes
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._index()):
+                self._remove(path)
@@ -0,0 +1,74 @@
+import copy
+import inspect
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+from .change_detection_model import SNUNet_ECAM, conv_block_nested
+from .registry import model_registry, artifact_paths
+
+
+def fuse_model(model):
+    # conv2 -> bn2 folds cleanly. bn1 is left alone: the residual branch of
+    # conv_block_nested reads conv1's output *before* bn1, so folding it into
+    # conv1 would change the identity path.
+    fused = copy.deepcopy(model).eval()
+    for module in fused.modules():
+        if isinstance(module, conv_block_nested) and isinstance(module.bn2, nn.BatchNorm2d):
+            module.conv2 = fuse_conv_bn_eval(module.conv2, module.bn2)
+            module.bn2 = nn.Identity()
+    return fused
+
+
+def load_fp32_model(model_path):
+    model = SNUNet_ECAM(in_ch=3, out_ch=1)
+    try:
+        model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    except Exception as e:
+        raise Exception(f"Failed to load model from {model_path}: {str(e)}")
+    return model.eval()
+
+
+def export_torchscript(model, path, img_size=256):
+    example = (torch.randn(1, 3, img_size, img_size), torch.randn(1, 3, img_size, img_size))
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        frozen = torch.jit.freeze(traced)
+    torch.jit.save(frozen, path)
+    return frozen
+
+
+def export_onnx(model, path, img_size=256, opset_version=13):
+    example = (torch.randn(1, 3, img_size, img_size), torch.randn(1, 3, img_size, img_size))
+    dynamic = {0: "batch", 2: "height", 3: "width"}
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            model, example, path,
+            input_names=["before", "after"],
+            output_names=["logits"],
+            dynamic_axes={"before": dynamic, "after": dynamic, "logits": dynamic},
+            opset_version=opset_version,
+            **kwargs
+        )
+
+
+def export_model(model_path, formats=("torchscript", "onnx"), img_size=256):
+    model = load_fp32_model(model_path)
+    fused = fuse_model(model)
+    paths = artifact_paths(model_path)
+
+    written = {}
+    if "torchscript" in formats:
+        scripted = export_torchscript(fused, paths["torchscript"], img_size)
+        xA, xB = torch.randn(1, 3, img_size, img_size), torch.randn(1, 3, img_size, img_size)
+        with torch.no_grad():
+            diff = (model(xA, xB) - scripted(xA, xB)).abs().max().item()
+        written["torchscript"] = {"path": paths["torchscript"], "max_abs_diff": diff}
+    if "onnx" in formats:
+        export_onnx(fused, paths["onnx"], img_size)
+        written["onnx"] = {"path": paths["onnx"]}
+
+    model_registry.evict(model_path)
+    return written
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import torch
+from .disk_cache import DiskIndex, atomic_write, payload_key
+from .probability_cache import probability_cache
+from .radiometry import DEFAULT_SCALING
+from .raster import Raster
+
+
+def _nbytes(features):
+    return sum(f.numel() * f.element_size() for f in features)
+
+
+class FeatureCache:
+    # Encoder features of baseline tiles, so a fixed "before" image compared against
+    # many later dates only runs its encoder once. Features are kept as float16, in
+    # memory and, with a directory, also on disk, each tier under its own cap.
+    # Eviction only takes other baselines (whole baselines in memory, oldest files on
+    # disk), never tiles of the baseline being stored: once that one alone fills a tier,
+    # further tiles are not admitted, so a sequential scan keeps hitting the tiles
+    # already held instead of evicting each one just before it is needed again.
+    def __init__(self, max_bytes=1 << 30, directory=None, max_disk_bytes=8 << 30, digests=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.digests = digests or probability_cache
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._scopes = OrderedDict()
+        self._bytes = 0
+        self._disk = DiskIndex(directory, ".pt") if directory else None
+        self._lock = threading.Lock()
+
+    def baseline(self, image, model_path=None, device="cpu", precision="fp32", scaling=None, tile_size=None):
+        # Handle for one baseline image under one set of weights and settings;
+        # None when the image cannot be fingerprinted.
+        digest = self.digests.source_digest(image)
+        if digest is None:
+            return None
+        scaling = image.scaling if isinstance(image, Raster) else scaling or DEFAULT_SCALING
+        payload = {
+            "baseline": digest,
+            "weights": self.digests.weights_digest(model_path, precision),
+            "device": str(device),
+            "precision": precision,
+            "scaling": list(scaling.key()),
+            "tile_size": tile_size,
+        }
+        scope = payload_key(payload)
+        return BaselineFeatures(self, scope)
+
+    def key(self):
+        # Maps decoded from float16 baseline features are cached apart from full-precision runs
+        return ("features", "float16")
+
+    def get(self, scope, key):
+        with self._lock:
+            features = self._entries.get((scope, key))
+            if features is not None:
+                self._scopes.move_to_end(scope)
+                self.hits += 1
+                return features
+        features = self._load(scope, key)
+        with self._lock:
+            if features is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(scope, key, features)
+        return features
+
+    def put(self, scope, key, features):
+        # Stored on the CPU as float16, detached from the batch they were computed in
+        features = [f.detach().to("cpu", torch.float16, copy=True) for f in features]
+        self._remember(scope, key, features)
+        if self._disk is not None:
+            self._save(scope, key, features)
+
+    def _remember(self, scope, key, features):
+        size = _nbytes(features)
+        with self._lock:
+            if (scope, key) in self._entries:
+                return
+            self._scopes[scope] = self._scopes.get(scope, 0)
+            self._scopes.move_to_end(scope)
+            for other in list(self._scopes):
+                if self._bytes + size <= self.max_bytes or other == scope:
+                    break
+                self._drop_scope(other)
+            if self._bytes + size > self.max_bytes:
+                return
+            self._entries[(scope, key)] = features
+            self._scopes[scope] += size
+            self._bytes += size
+
+    def _drop_scope(self, scope):
+        for entry in [entry for entry in self._entries if entry[0] == scope]:
+            del self._entries[entry]
+        self._bytes -= self._scopes.pop(scope)
+
+    def _path(self, scope, key):
+        return os.path.join(self.directory, scope, key + ".pt")
+
+    def _load(self, scope, key):
+        if self._disk is None:
+            return None
+        path = self._path(scope, key)
+        try:
+            features = torch.load(path, map_location="cpu")
+        except (OSError, RuntimeError, EOFError):
+            return None
+        self._disk.touch(path)
+        return features
+
+    def _save(self, scope, key, features):
+        path = self._path(scope, key)
+        if path in self._disk:
+            return
+        current = os.path.join(self.directory, scope)
+        if not self._disk.evict(self.max_disk_bytes, _nbytes(features),
+                                keep=lambda old: os.path.dirname(old) == current):
+            return
+        atomic_write(path, lambda f: torch.save(features, f))
+        self._disk.add(path)
+
+    def memory_bytes(self):
+        return self._bytes
+
+    def disk_bytes(self):
+        return self._disk.total() if self._disk is not None else 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+            self._bytes = 0
+
+
+class BaselineFeatures:
+    # Per-tile view of a FeatureCache for one baseline image; windows are (y0, y1, x0, x1)
+    def __init__(self, cache, scope):
+        self.cache = cache
+        self.scope = scope
+
+    def _key(self, window):
+        return hashlib.blake2b(str(window).encode(), digest_size=16).hexdigest()
+
+    def get(self, window, device="cpu"):
+        features = self.cache.get(self.scope, self._key(window))
+        if features is None:
+            return None
+        return [f.to(device, torch.float32) for f in features]
+
+    def put(self, window, features):
+        self.cache.put(self.scope, self._key(window), features)
@@ -0,0 +1,240 @@
+import json
+import os
+import cv2
+import numpy as np
+from .raster import _import_rasterio
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+MODEL_PIXEL_SCALE = 33550
+MODEL_TIEPOINT = 33922
+MODEL_TRANSFORMATION = 34264
+GEO_KEY_DIRECTORY = 34735
+GEO_DOUBLE_PARAMS = 34736
+GEO_ASCII_PARAMS = 34737
+GEOTIFF_TAGS = (MODEL_PIXEL_SCALE, MODEL_TIEPOINT, MODEL_TRANSFORMATION,
+                GEO_KEY_DIRECTORY, GEO_DOUBLE_PARAMS, GEO_ASCII_PARAMS)
+GEOGRAPHIC_TYPE_KEY = 2048
+PROJECTED_CS_TYPE_KEY = 3072
+
+
+class Georeference:
+    # GeoTIFF tags of a source image plus the affine transform they describe.
+    # transform is (a, b, c, d, e, f): x = a*col + b*row + c, y = d*col + e*row + f.
+    def __init__(self, tags, width, height):
+        self.tags = dict(tags)
+        self.width = width
+        self.height = height
+        self.transform = _transform_from_tags(self.tags)
+        self.crs = _crs_from_tags(self.tags)
+
+    @property
+    def pixel_area(self):
+        if self.transform is None:
+            return 1.0
+        a, b, _, d, e, _ = self.transform
+        return abs(a * e - b * d)
+
+    def resized(self, width, height):
+        # Same footprint on the ground, covered by a mask of a different size
+        if (width, height) == (self.width, self.height):
+            return self
+        sx, sy = self.width / width, self.height / height
+        tags = dict(self.tags)
+        if MODEL_TRANSFORMATION in tags:
+            dtype, count, m = tags[MODEL_TRANSFORMATION]
+            m = list(m)
+            for row in range(4):
+                m[row * 4] *= sx
+                m[row * 4 + 1] *= sy
+            tags[MODEL_TRANSFORMATION] = (dtype, count, tuple(m))
+        if MODEL_PIXEL_SCALE in tags:
+            dtype, count, scale = tags[MODEL_PIXEL_SCALE]
+            tags[MODEL_PIXEL_SCALE] = (dtype, count, (scale[0] * sx, scale[1] * sy) + tuple(scale[2:]))
+        if MODEL_TIEPOINT in tags:
+            dtype, count, tie = tags[MODEL_TIEPOINT]
+            tie = list(tie)
+            for i in range(0, len(tie), 6):
+                tie[i] /= sx
+                tie[i + 1] /= sy
+            tags[MODEL_TIEPOINT] = (dtype, count, tuple(tie))
+        return Georeference(tags, width, height)
+
+    def extratags(self):
+        return [(code, dtype, 0 if isinstance(value, str) else count, value, True)
+                for code, (dtype, count, value) in sorted(self.tags.items())]
+
+    def to_map(self, points):
+        # points: (N, 2) array of pixel-corner (col, row) coordinates
+        points = np.asarray(points, dtype=np.float64)
+        if self.transform is None:
+            return points
+        a, b, c, d, e, f = self.transform
+        return np.stack([a * points[:, 0] + b * points[:, 1] + c,
+                         d * points[:, 0] + e * points[:, 1] + f], axis=1)
+
+
+def _transform_from_tags(tags):
+    if MODEL_TRANSFORMATION in tags:
+        m = tags[MODEL_TRANSFORMATION][2]
+        return (m[0], m[1], m[3], m[4], m[5], m[7])
+    if MODEL_PIXEL_SCALE in tags and MODEL_TIEPOINT in tags:
+        sx, sy = tags[MODEL_PIXEL_SCALE][2][:2]
+        i, j, _, x, y, _ = tags[MODEL_TIEPOINT][2][:6]
+        return (sx, 0.0, x - i * sx, 0.0, -sy, y + j * sy)
+    return None
+
+
+def _crs_from_tags(tags):
+    if GEO_KEY_DIRECTORY not in tags:
+        return None
+    keys = tags[GEO_KEY_DIRECTORY][2]
+    codes = {}
+    for i in range(4, len(keys) - 3, 4):
+        key, location, _, value = keys[i:i + 4]
+        if location == 0:
+            codes[key] = value
+    for key in (PROJECTED_CS_TYPE_KEY, GEOGRAPHIC_TYPE_KEY):
+        if 0 < codes.get(key, 0) < 32767:
+            return f"EPSG:{codes[key]}"
+    return None
+
+
+def read_georeference(source):
+    # source may be a path or anything with a .path (Raster handles); None when not georeferenced
+    path = getattr(source, "path", source)
+    if tifffile is None or not isinstance(path, str) or not path.lower().endswith(('.tif', '.tiff')):
+        return None
+    try:
+        with tifffile.TiffFile(path) as tif:
+            page = tif.pages[0]
+            tags = {tag.code: (int(tag.dtype), tag.count, tag.value)
+                    for tag in page.tags if tag.code in GEOTIFF_TAGS}
+            width, height = page.imagewidth, page.imagelength
+    except (OSError, ValueError):
+        return None
+    if not tags:
+        return None
+    return Georeference(tags, width, height)
+
+
+def vectorize_mask(mask, georef=None, min_area=0, simplify=0.0):
+    # Connected changed regions as GeoJSON polygons (outer ring plus holes), in map
+    # coordinates when georef is given, otherwise in pixel coordinates.
+    binary = (np.asarray(mask) > 0).astype(np.uint8)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    pixel_area = georef.pixel_area if georef is not None else 1.0
+    rings = _region_rings(labels, binary)
+
+    features = []
+    for label in range(1, count):
+        pixels = int(stats[label, cv2.CC_STAT_AREA])
+        if pixels < min_area or label not in rings:
+            continue
+        coordinates = []
+        for polygon in rings[label]:
+            coordinates.append([_ring(points, georef, simplify) for points in polygon])
+        left, top = int(stats[label, cv2.CC_STAT_LEFT]), int(stats[label, cv2.CC_STAT_TOP])
+        features.append({
+            "type": "Feature",
+            "geometry": {
+                "type": "Polygon" if len(coordinates) == 1 else "MultiPolygon",
+                "coordinates": coordinates[0] if len(coordinates) == 1 else coordinates,
+            },
+            "properties": {
+                "id": len(features) + 1,
+                "pixels": pixels,
+                "area": pixels * pixel_area,
+                "bbox_pixels": [left, top, left + int(stats[label, cv2.CC_STAT_WIDTH]),
+                                top + int(stats[label, cv2.CC_STAT_HEIGHT])],
+            },
+        })
+    return features
+
+
+def _region_rings(labels, binary):
+    # Rings along pixel edges, in pixel-corner coordinates: {label: [[outer, hole, ...], ...]}
+    # with each ring an open (N, 2) array of vertices
+    rasterio = _import_rasterio()
+    if rasterio is not None:
+        import rasterio.features
+
+        rings = {}
+        for geometry, label in rasterio.features.shapes(labels, mask=binary > 0, connectivity=8):
+            polygon = [np.array(ring[:-1], dtype=np.float64) for ring in geometry["coordinates"]]
+            rings.setdefault(int(label), []).append(polygon)
+        return rings
+
+    # Contours of the mask upsampled 2x run through half-pixel centres, and each of those
+    # maps to its nearest pixel corner, giving the outline of the pixels themselves
+    upsampled = np.repeat(np.repeat(binary, 2, axis=0), 2, axis=1)
+    contours, hierarchy = cv2.findContours(upsampled, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_NONE)
+    rings = {}
+    for index, contour in enumerate(contours):
+        if hierarchy[0][index][3] != -1:
+            continue
+        x, y = contour[0][0]
+        polygon = [_corner_ring(contour)]
+        child = hierarchy[0][index][2]
+        while child != -1:
+            polygon.append(_corner_ring(contours[child]))
+            child = hierarchy[0][child][0]
+        rings.setdefault(int(labels[y // 2, x // 2]), []).append(polygon)
+    return rings
+
+
+def _corner_ring(contour):
+    points = (contour.reshape(-1, 2) + 1) // 2
+    points = points[np.any(points != np.roll(points, 1, axis=0), axis=1)]
+    # Only the corners are kept, not every unit step along straight edges
+    incoming = points - np.roll(points, 1, axis=0)
+    outgoing = np.roll(points, -1, axis=0) - points
+    turns = incoming[:, 0] * outgoing[:, 1] != incoming[:, 1] * outgoing[:, 0]
+    return points[turns].astype(np.float64)
+
+
+def _ring(points, georef, simplify):
+    if simplify > 0:
+        points = cv2.approxPolyDP(points.astype(np.float32).reshape(-1, 1, 2), simplify, True)
+        points = points.reshape(-1, 2).astype(np.float64)
+    if georef is not None:
+        points = georef.to_map(points)
+    ring = points.tolist()
+    ring.append(ring[0])
+    return ring
+
+
+def area_stats(features):
+    areas = np.array([feature["properties"]["area"] for feature in features], dtype=np.float64)
+    if not len(areas):
+        return {"regions": 0, "total_area": 0.0, "mean_area": 0.0, "median_area": 0.0, "max_area": 0.0}
+    return {
+        "regions": int(len(areas)),
+        "total_area": float(areas.sum()),
+        "mean_area": float(areas.mean()),
+        "median_area": float(np.median(areas)),
+        "max_area": float(areas.max()),
+    }
+
+
+def feature_collection(features, georef=None, threshold=None):
+    collection = {"type": "FeatureCollection", "features": features, "stats": area_stats(features)}
+    if georef is not None and georef.crs:
+        collection["crs"] = {"type": "name",
+                             "properties": {"name": "urn:ogc:def:crs:" + georef.crs.replace(":", "::")}}
+    if threshold is not None:
+        collection["threshold"] = threshold
+    return collection
+
+
+def write_geojson(features, path, georef=None, threshold=None):
+    collection = feature_collection(features, georef, threshold)
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(collection, f)
+    return collection["stats"]
\ No newline at end of file
@@ -0,0 +1,163 @@
+import io
+import json
+import os
+import cv2
+import numpy as np
+from PIL import Image, PngImagePlugin
+from .geo import feature_collection, vectorize_mask
+from .probability_cache import quantize_probabilities
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+MASK_FORMATS = ('.png', '.tif', '.tiff', '.rle', '.geojson')
+TIFF_TILE = 256
+
+
+def output_size(size, scale=1.0):
+    # size is (width, height) of the source
+    if scale == 1.0:
+        return tuple(size)
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+
+
+def resize_probabilities(prob_map, size):
+    # Interpolating probabilities before thresholding keeps mask edges smooth and strictly binary
+    prob_map = quantize_probabilities(prob_map)
+    if size is None or (prob_map.shape[1], prob_map.shape[0]) == tuple(size):
+        return prob_map
+    interpolation = cv2.INTER_LINEAR if size[0] > prob_map.shape[1] else cv2.INTER_AREA
+    return cv2.resize(prob_map, tuple(size), interpolation=interpolation)
+
+
+def threshold_mask(prob_map, threshold=0.5):
+    # A lookup table keeps re-thresholding a retained map in the millisecond range
+    lut = np.where(np.arange(256) > threshold * 255, 255, 0).astype(np.uint8)
+    return cv2.LUT(quantize_probabilities(prob_map), lut)
+
+
+def mask_from_probabilities(prob_map, threshold=0.5, size=None):
+    return threshold_mask(resize_probabilities(prob_map, size), threshold)
+
+
+def encode_rle(mask):
+    # Row-major run lengths, alternating background/foreground and starting with background
+    flat = np.asarray(mask).reshape(-1) > 0
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate(([0], changes, [flat.size]))
+    counts = np.diff(bounds)
+    if flat.size and flat[0]:
+        counts = np.concatenate(([0], counts))
+    return counts.tolist()
+
+
+def decode_rle(counts, shape):
+    values = np.zeros(len(counts), dtype=np.uint8)
+    values[1::2] = 255
+    return np.repeat(values, counts).reshape(shape)
+
+
+def read_rle(path):
+    with open(path) as f:
+        data = json.load(f)
+    return decode_rle(data["counts"], data["size"])
+
+
+def _binary(mask):
+    array = np.asarray(mask)
+    return array if array.dtype == np.bool_ else array > 0
+
+
+def iter_mask_tiles(row_blocks, width, tile=TIFF_TILE):
+    # Regroups blocks of mask rows, in order, into zero-padded tiles in TIFF tile order.
+    # Only one strip of tile rows is held at a time.
+    strip = np.zeros((tile, -(-width // tile) * tile), dtype=np.uint8)
+    filled = 0
+    for block in row_blocks:
+        block = np.asarray(block)
+        pos = 0
+        while pos < len(block):
+            n = min(tile - filled, len(block) - pos)
+            np.multiply(block[pos:pos + n] > 0, 255, out=strip[filled:filled + n, :width], casting="unsafe")
+            filled += n
+            pos += n
+            if filled == tile:
+                for x in range(0, strip.shape[1], tile):
+                    yield strip[:, x:x + tile].copy()
+                strip[:] = 0
+                filled = 0
+    if filled:
+        for x in range(0, strip.shape[1], tile):
+            yield strip[:, x:x + tile]
+
+
+def write_mask_tiff(target, row_blocks, width, height, threshold=None, georef=None):
+    # target is a path or a binary file object. Rows are streamed into a tiled,
+    # deflate-compressed TIFF carrying the source's GeoTIFF tags when given.
+    description = f"threshold={threshold:g}" if threshold is not None else None
+    if tifffile is None:
+        mask = np.concatenate([np.asarray(block) > 0 for block in row_blocks])
+        options = {"tiffinfo": {270: description}} if description else {}
+        Image.fromarray(mask).save(target, format="TIFF", compression="group4", **options)
+        return
+    extratags = georef.resized(width, height).extratags() if georef is not None else []
+    tifffile.imwrite(
+        target, data=iter_mask_tiles(row_blocks, width), shape=(height, width), dtype=np.uint8,
+        photometric='minisblack', compression='zlib', tile=(TIFF_TILE, TIFF_TILE),
+        description=description, metadata=None, extratags=extratags,
+    )
+
+
+def _row_blocks(binary, rows=TIFF_TILE):
+    for y in range(0, binary.shape[0], rows):
+        yield binary[y:y + rows]
+
+
+def encode_mask(mask, fmt='.png', threshold=None, georef=None):
+    fmt = fmt.lower()
+    binary = _binary(mask)
+    description = f"threshold={threshold:g}" if threshold is not None else None
+    buffer = io.BytesIO()
+
+    if fmt == '.geojson':
+        georef = georef.resized(binary.shape[1], binary.shape[0]) if georef is not None else None
+        return json.dumps(feature_collection(vectorize_mask(binary, georef), georef, threshold)).encode()
+
+    if fmt == '.rle':
+        data = {"size": list(binary.shape), "order": "row-major", "counts": encode_rle(binary)}
+        if threshold is not None:
+            data["threshold"] = threshold
+        return json.dumps(data).encode()
+
+    if fmt in ('.tif', '.tiff'):
+        write_mask_tiff(buffer, _row_blocks(binary), binary.shape[1], binary.shape[0], threshold, georef)
+        return buffer.getvalue()
+
+    if fmt == '.png':
+        options = {}
+        if description:
+            info = PngImagePlugin.PngInfo()
+            info.add_text("threshold", f"{threshold:g}")
+            options["pnginfo"] = info
+        # Bilevel PNG: one bit per pixel
+        Image.fromarray(binary).save(buffer, format="PNG", **options)
+        return buffer.getvalue()
+
+    Image.fromarray(binary.astype(np.uint8) * 255).save(buffer, format=Image.registered_extensions().get(fmt, "PNG"))
+    return buffer.getvalue()
+
+
+def save_mask(mask, output_path, threshold=None, georef=None):
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    fmt = os.path.splitext(output_path)[1].lower()
+    if fmt in ('.tif', '.tiff'):
+        binary = _binary(mask)
+        write_mask_tiff(output_path, _row_blocks(binary), binary.shape[1], binary.shape[0], threshold, georef)
+        return
+    data = encode_mask(mask, fmt, threshold, georef)
+    with open(output_path, "wb") as f:
+        f.write(data)
\ No newline at end of file
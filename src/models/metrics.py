@@ -0,0 +1,26 @@
+import numpy as np
+
+
+def confusion(pred, label):
+    pred = np.asarray(pred) > 0
+    label = np.asarray(label) > 0
+    tp = int(np.count_nonzero(pred & label))
+    fp = int(np.count_nonzero(pred & ~label))
+    fn = int(np.count_nonzero(~pred & label))
+    tn = int(pred.size - tp - fp - fn)
+    return {"tp": tp, "fp": fp, "fn": fn, "tn": tn}
+
+
+def add_confusion(total, counts):
+    for key, value in counts.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def scores(counts):
+    tp, fp, fn = counts["tp"], counts["fp"], counts["fn"]
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    iou = tp / (tp + fp + fn) if tp + fp + fn else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1, "iou": iou}
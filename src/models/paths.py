@@ -0,0 +1,14 @@
+import os
+import sys
+
+
+def app_dir():
+    return os.path.dirname(os.path.dirname(sys.executable))
+
+
+def default_model_path():
+    return os.path.join(app_dir(), "model", "model.pth")
+
+
+def default_cache_dir():
+    return os.path.join(app_dir(), "cache", "probabilities")
\ No newline at end of file
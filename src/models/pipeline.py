@@ -0,0 +1,224 @@
+import os
+import queue
+import threading
+import time
+import torch
+from .batch import open_pair, source_georeferences
+from .mask_io import mask_from_probabilities, output_size, save_mask
+from .predict import cache_config
+from .preprocess import raster_to_input
+from .probability_cache import quantize_probabilities
+from .registry import model_registry, resolve_device
+from .tiling import predict_tiled
+
+_DONE = object()
+POLL_SECONDS = 0.1
+
+
+class StageQueue:
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.put_stall = 0.0
+        self.get_stall = 0.0
+        self.items = 0
+        self.depth_total = 0
+        self.max_depth = 0
+
+    def put(self, item, stop):
+        start = time.perf_counter()
+        while not stop.is_set():
+            try:
+                self.queue.put(item, timeout=POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        waited = time.perf_counter() - start
+        with self.lock:
+            self.put_stall += waited
+            depth = self.queue.qsize()
+            self.items += 1
+            self.depth_total += depth
+            self.max_depth = max(self.max_depth, depth)
+        return not stop.is_set()
+
+    def get(self, stop):
+        start = time.perf_counter()
+        item = _DONE
+        while not stop.is_set():
+            try:
+                item = self.queue.get(timeout=POLL_SECONDS)
+                break
+            except queue.Empty:
+                continue
+        with self.lock:
+            self.get_stall += time.perf_counter() - start
+        return item
+
+    def stats(self):
+        return {
+            "capacity": self.queue.maxsize,
+            "items": self.items,
+            "mean_depth": self.depth_total / self.items if self.items else 0.0,
+            "max_depth": self.max_depth,
+            "put_stall_seconds": self.put_stall,
+            "get_stall_seconds": self.get_stall,
+        }
+
+
+def run_pipeline(pairs, output_dir, model_path=None, device=None, batch_size=8, img_size=256,
+                 tile_size=None, overlap=32, tile_batch_size=4, precision="fp32", scaling=None, decode_threads=2,
+                 write_threads=2, queue_size=None, cache=None, threshold=0.5, output_scale=1.0,
+                 output_format=".png", log=print):
+    # batch_size pairs share a forward pass at the fixed input size. Tiled runs go one
+    # pair at a time with tile_batch_size tiles per pass, and only raster handles are
+    # queued, so memory-mapped scenes are read tile by tile rather than decoded whole.
+    device = resolve_device(device)
+    os.makedirs(output_dir, exist_ok=True)
+
+    group_size = 1 if tile_size else batch_size
+    queue_size = queue_size or 2 * group_size
+    decoded = StageQueue("decoded", queue_size)
+    predicted = StageQueue("predicted", queue_size)
+    stop = threading.Event()
+    source = iter(pairs)
+    source_lock = threading.Lock()
+    failed = []
+    busy = {"decode": 0.0, "forward": 0.0, "write": 0.0}
+    busy_lock = threading.Lock()
+    written = [0]
+    cached = [0]
+    errors = []
+    georefs = source_georeferences(pairs, output_format)
+    config = cache_config(img_size, tile_size, overlap)
+
+    def add_busy(stage, seconds):
+        with busy_lock:
+            busy[stage] += seconds
+
+    def decode():
+        try:
+            while not stop.is_set():
+                with source_lock:
+                    pair = next(source, None)
+                if pair is None:
+                    break
+                name, before_path, after_path = pair
+                start = time.perf_counter()
+                key = None
+                try:
+                    if cache is not None:
+                        key = cache.key_for(before_path, after_path, model_path, precision, scaling, **config)
+                        hit = cache.get(key)
+                        if hit is not None:
+                            with busy_lock:
+                                cached[0] += 1
+                            if not predicted.put((name, hit[0], hit[1], None), stop):
+                                break
+                            continue
+                    rasterA, rasterB = open_pair(before_path, after_path, scaling)
+                    size = (rasterA.shape[1], rasterA.shape[0])
+                    if tile_size:
+                        imgA, imgB = rasterA, rasterB
+                    else:
+                        imgA, imgB = raster_to_input(rasterA, img_size), raster_to_input(rasterB, img_size)
+                        rasterA.close()
+                        rasterB.close()
+                except Exception as e:
+                    failed.append((name, str(e)))
+                    log(f"[skip] {name}: {str(e)}")
+                    continue
+                finally:
+                    add_busy("decode", time.perf_counter() - start)
+                if not decoded.put((name, imgA, imgB, size, key), stop):
+                    break
+        finally:
+            decoded.put(_DONE, stop)
+
+    def write():
+        while True:
+            item = predicted.get(stop)
+            if item is _DONE:
+                break
+            name, prob_map, size, key = item
+            start = time.perf_counter()
+            try:
+                prob_map = quantize_probabilities(prob_map)
+                if key:
+                    cache.put(key, prob_map, size)
+                mask = mask_from_probabilities(prob_map, threshold, output_size(size, output_scale))
+                save_mask(mask, os.path.join(output_dir, name + output_format), threshold, georefs.get(name))
+                with busy_lock:
+                    written[0] += 1
+                    done = written[0] + len(failed)
+                # Progress counts every mask written, cache hits included
+                if done % group_size == 0 or done == len(pairs):
+                    elapsed = time.perf_counter() - started
+                    log(f"{done}/{len(pairs)} pairs, {done / elapsed:.2f} pairs/s")
+            except Exception as e:
+                failed.append((name, str(e)))
+                log(f"[skip] {name}: {str(e)}")
+            add_busy("write", time.perf_counter() - start)
+
+    def forward(batch):
+        start = time.perf_counter()
+        # Loaded on first use so a run served entirely from the cache never touches the weights
+        model = model_registry.get(model_path, device, precision=precision)
+        if tile_size:
+            results = []
+            for name, rasterA, rasterB, size, key in batch:
+                try:
+                    results.append((name, predict_tiled(model, rasterA, rasterB, tile_size=tile_size, overlap=overlap,
+                                                        batch_size=tile_batch_size, device=device), size, key))
+                finally:
+                    rasterA.close()
+                    rasterB.close()
+        else:
+            batchA = torch.cat([item[1] for item in batch]).to(device)
+            batchB = torch.cat([item[2] for item in batch]).to(device)
+            with torch.no_grad():
+                prob_maps = torch.sigmoid(model(batchA, batchB)[:, 0]).cpu().numpy()
+            results = [(name, prob_map, size, key) for (name, _, _, size, key), prob_map in zip(batch, prob_maps)]
+        add_busy("forward", time.perf_counter() - start)
+        for result in results:
+            predicted.put(result, stop)
+
+    decoders = [threading.Thread(target=decode, daemon=True) for _ in range(decode_threads)]
+    writers = [threading.Thread(target=write, daemon=True) for _ in range(write_threads)]
+    started = time.perf_counter()
+    for thread in decoders + writers:
+        thread.start()
+
+    try:
+        finished = 0
+        batch = []
+        while finished < decode_threads:
+            item = decoded.get(stop)
+            if item is _DONE:
+                finished += 1
+            else:
+                batch.append(item)
+            if batch and (len(batch) == group_size or finished == decode_threads):
+                forward(batch)
+                batch = []
+        for _ in writers:
+            predicted.put(_DONE, stop)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    for thread in decoders + writers:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - started
+    return {
+        "pairs": written[0],
+        "failed": failed,
+        "seconds": elapsed,
+        "pairs_per_second": written[0] / elapsed if elapsed > 0 else 0.0,
+        "cache_hits": cached[0],
+        "busy_seconds": busy,
+        "queues": {q.name: q.stats() for q in (decoded, predicted)},
+    }
\ No newline at end of file
@@ -0,0 +1,152 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from .batch import chunked
+
+_worker = {}
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_workers(workers=None, threads=None, cores=None):
+    cores = cores if cores is not None else available_cores()
+    if workers is None and threads is None:
+        threads = 1 if len(cores) < 4 else 2
+    if workers is None:
+        workers = max(1, len(cores) // threads)
+    if threads is None:
+        threads = max(1, len(cores) // workers)
+    if workers < 1 or threads < 1:
+        raise Exception(f"Invalid pool split: {workers} workers x {threads} threads")
+    slices = []
+    for index in range(workers):
+        start = index * threads
+        if start + threads <= len(cores):
+            slices.append(cores[start:start + threads])
+        else:
+            slices.append(None)
+    return workers, threads, slices
+
+
+def _init_worker(core_slices, threads, model_path, precision, options, output_format):
+    import torch
+    from .registry import model_registry
+
+    cores = core_slices.get()
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    _worker["model"] = model_registry.get(model_path, "cpu", precision=precision)
+    _worker["options"] = options
+    _worker["output_format"] = output_format
+    _worker["cores"] = cores
+
+
+def _process_chunk(chunk):
+    from .batch import predict_chunk, source_georeferences
+    from .mask_io import encode_mask
+
+    start = time.perf_counter()
+    results, failed = predict_chunk(_worker["model"], chunk, device="cpu", **_worker["options"])
+    georefs = source_georeferences(chunk, _worker["output_format"])
+    encoded = [(name, encode_mask(mask, _worker["output_format"], _worker["options"]["threshold"], georefs.get(name)))
+               for name, mask in results]
+    return os.getpid(), encoded, failed, time.perf_counter() - start
+
+
+class DetectionPool:
+    def __init__(self, model_path=None, workers=None, threads=None, precision="fp32", batch_size=8,
+                 img_size=256, tile_size=None, overlap=32, tile_batch_size=4, scaling=None, threshold=0.5,
+                 output_scale=1.0, output_format=".png", max_pending=None):
+        self.workers, self.threads, slices = plan_workers(workers, threads)
+        self.max_pending = max_pending or 2 * self.workers
+        self.batch_size = batch_size
+        options = {"batch_size": batch_size, "img_size": img_size, "tile_size": tile_size, "overlap": overlap,
+                   "tile_batch_size": tile_batch_size, "scaling": scaling, "threshold": threshold,
+                   "output_scale": output_scale}
+
+        context = multiprocessing.get_context("spawn")
+        core_slices = context.Queue()
+        for cores in slices:
+            core_slices.put(cores)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(core_slices, self.threads, model_path, precision, options, output_format),
+        )
+
+    def map(self, pairs):
+        chunks = iter(chunked(pairs, self.batch_size))
+        pending = set()
+        while True:
+            while len(pending) < self.max_pending:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.add(self.executor.submit(_process_chunk, chunk))
+            if not pending:
+                return
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_pool(pairs, output_dir, model_path=None, workers=None, threads=None, batch_size=8, img_size=256,
+             tile_size=None, overlap=32, tile_batch_size=4, precision="fp32", scaling=None, threshold=0.5, output_scale=1.0,
+             output_format=".png", log=print):
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    done = 0
+    failed = []
+    compressed_bytes = 0
+    per_worker = {}
+    with DetectionPool(model_path, workers=workers, threads=threads, precision=precision,
+                       batch_size=batch_size, img_size=img_size, tile_size=tile_size,
+                       overlap=overlap, tile_batch_size=tile_batch_size, scaling=scaling, threshold=threshold, output_scale=output_scale,
+                       output_format=output_format) as pool:
+        log(f"{pool.workers} workers x {pool.threads} threads")
+        for pid, encoded, errors, seconds in pool.map(pairs):
+            for name, error in errors:
+                failed.append((name, error))
+                log(f"[skip] {name}: {error}")
+            for name, data in encoded:
+                with open(os.path.join(output_dir, name + output_format), "wb") as f:
+                    f.write(data)
+                compressed_bytes += len(data)
+            stats = per_worker.setdefault(pid, {"pairs": 0, "seconds": 0.0})
+            stats["pairs"] += len(encoded)
+            stats["seconds"] += seconds
+            done += len(encoded)
+
+            elapsed = time.perf_counter() - start
+            log(f"{done}/{len(pairs)} pairs, {done / elapsed:.2f} pairs/s")
+        split = (pool.workers, pool.threads)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "pairs": done,
+        "failed": failed,
+        "seconds": elapsed,
+        "pairs_per_second": done / elapsed if elapsed > 0 else 0.0,
+        "workers": split[0],
+        "threads_per_worker": split[1],
+        "mask_bytes": compressed_bytes,
+        "per_worker": per_worker,
+    }
\ No newline at end of file
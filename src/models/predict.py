@@ -1,65 +1,196 @@
 import os
-import sys
-import torch
+from contextlib import nullcontext
 import numpy as np
-from PIL import Image
-import torch.nn.functional as F
-from torchvision import transforms
-from .change_detection_model import SNUNet_ECAM
-import cv2
+import torch
+from .registry import model_registry, resolve_device
+from .tiling import iter_tiled_logits, predict_tiled
+from .progress import report, check_cancelled
+from .timing import NULL_TIMER
+from .raster import open_raster
+from .preprocess import INPUT_DOWNSAMPLING, overview_factor, resize_to_input
+from .probability_cache import quantize_probabilities
+from .mask_io import (mask_from_probabilities, output_size, resize_probabilities, save_mask, threshold_mask,
+                      write_mask_tiff)
+from .geo import read_georeference
 
-def predict_changes(imgA_path, imgB_path, model_path=None, output_path=None):
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    
-    img_size = 256
-    mean = [0.485, 0.456, 0.406]
-    std = [0.229, 0.224, 0.225]
-    
-    if model_path is None:
-        current_dir = os.path.dirname(os.path.dirname(sys.executable))
-        model_path = os.path.join(current_dir, "model", "model.pth")
-    
-    if output_path is None:
-        project_root = os.path.dirname(os.path.dirname(sys.executable))
-        output_dir = os.path.join(project_root, "result")
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, "result_image.png")
+IMG_SIZE = 256
+
+
+def predict_changes(imgA, imgB, model_path=None, output_path=None, device=None,
+                    tile_size=None, overlap=32, batch_size=4, precision="fp32", scaling=None,
+                    threshold=0.5, output_scale=1.0, cache=None, prescreen=None, features=None,
+                    progress_callback=None, cancel_check=None, timer=NULL_TIMER):
+    # imgA/imgB may be file paths, Raster handles or RGB arrays. The change mask is
+    # returned as a uint8 array at the source size times output_scale, and only
+    # written out when output_path is given.
+    prob_map, size = predict_probability_map(
+        imgA, imgB, model_path=model_path, device=device, tile_size=tile_size, overlap=overlap,
+        batch_size=batch_size, precision=precision, scaling=scaling, cache=cache, prescreen=prescreen,
+        features=features, progress_callback=progress_callback, cancel_check=cancel_check, timer=timer
+    )
     
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    report(progress_callback, "postprocess")
+    with timer.stage("resize"):
+        prob_map = resize_probabilities(prob_map, output_size(size, output_scale))
+    with timer.stage("threshold"):
+        change_mask = threshold_mask(prob_map, threshold)
     
-    model = SNUNet_ECAM(in_ch=3, out_ch=1)
+    check_cancelled(cancel_check)
+    if output_path:
+        report(progress_callback, "save")
+        with timer.stage("encode"):
+            save_mask(change_mask, output_path, threshold)
     
-    try:
-        model.load_state_dict(torch.load(model_path, map_location=device))
-    except Exception as e:
-        raise Exception(f"Failed to load model from {model_path}: {str(e)}")
+    return change_mask
+
+
+def cache_config(img_size, tile_size=None, overlap=32, prescreen=None, features=None):
+    # Settings besides the inputs and weights that change the probability map, hashed
+    # into probability cache keys by every entry point that shares the cache
+    if not tile_size:
+        return {"img_size": img_size, "downsampling": INPUT_DOWNSAMPLING}
+    config = {"tile_size": tile_size, "overlap": overlap}
+    if prescreen is not None:
+        config["prescreen"] = prescreen.key()
+    if features is not None:
+        config["features"] = features.key()
+    return config
+
+
+def predict_probability_map(imgA, imgB, model_path=None, device=None, tile_size=None, overlap=32,
+                            batch_size=4, precision="fp32", scaling=None, cache=None, prescreen=None,
+                            features=None, progress_callback=None, cancel_check=None, timer=NULL_TIMER):
+    # Returns the change probability quantized to uint8 and the (width, height) of
+    # the source. With a ProbabilityCache, a pair already seen with the same weights
+    # and settings skips the model entirely. A TilePrescreen and a FeatureCache for
+    # the before image only apply to tiled runs.
+    key = cached = None
+    if cache is not None:
+        with timer.stage("cache"):
+            config = cache_config(IMG_SIZE, tile_size, overlap, prescreen, features)
+            try:
+                key = cache.key_for(imgA, imgB, model_path, precision, scaling, **config)
+            except OSError:
+                key = None
+            cached = cache.get(key) if key else None
+    if cached is not None:
+        return cached
     
-    model.to(device)
-    model.eval()
+    prob_map, size = _predict_probabilities(
+        imgA, imgB, model_path, device, IMG_SIZE, tile_size, overlap, batch_size, precision, scaling,
+        progress_callback, cancel_check, timer, prescreen, features
+    )
+    if key:
+        with timer.stage("cache"):
+            cache.put(key, prob_map, size)
+    return prob_map, size
+
+
+def _predict_probabilities(imgA, imgB, model_path, device, img_size, tile_size, overlap, batch_size,
+                           precision, scaling, progress_callback, cancel_check, timer, prescreen=None,
+                           features=None):
+    # Returns the quantized probability map and the (width, height) of the source
+    device = resolve_device(device)
+    features = features if tile_size else None
     
-    preprocess = transforms.Compose([
-        transforms.Resize((img_size, img_size)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=mean, std=std)
-    ])
+    report(progress_callback, "load")
+    with timer.stage("load"):
+        # Reusing baseline features needs the eager model, which has separate encode/decode steps
+        model = model_registry.get(model_path, device, optimized=features is None, precision=precision)
+    check_cancelled(cancel_check)
     
-    try:
-        imgA = Image.open(imgA_path).convert("RGB")
-        imgB = Image.open(imgB_path).convert("RGB")
-    except Exception as e:
-        raise Exception(f"Failed to open images: {str(e)}")
+    report(progress_callback, "preprocess")
+    with timer.stage("decode"):
+        try:
+            rasterA = open_raster(imgA, scaling=scaling)
+            rasterB = open_raster(imgB, scaling=scaling)
+        except Exception as e:
+            raise Exception(f"Failed to open images: {str(e)}")
+    check_cancelled(cancel_check)
     
-    tensorA = preprocess(imgA).unsqueeze(0).to(device)
-    tensorB = preprocess(imgB).unsqueeze(0).to(device)
+    if tile_size:
+        if rasterA.shape != rasterB.shape:
+            raise Exception(f"Image sizes differ: {rasterA.shape[:2]} vs {rasterB.shape[:2]}")
+        baseline = None
+        if features is not None:
+            with timer.stage("features"):
+                baseline = features.baseline(rasterA, model_path, device, precision, scaling, tile_size)
+        if prescreen is not None:
+            prescreen.prepare(model, rasterA, rasterB, device, timer)
+        # After a coarse pass, the tiled pass is the refinement stage of a two-stage run
+        with timer.stage(prescreen.stage) if prescreen is not None and prescreen.stage else nullcontext():
+            prob_map = predict_tiled(
+                model, rasterA, rasterB,
+                tile_size=tile_size, overlap=overlap, batch_size=batch_size, device=device,
+                progress_callback=progress_callback, cancel_check=cancel_check, timer=timer, prescreen=prescreen,
+                baseline=baseline
+            )
+    else:
+        with timer.stage("decode"):
+            # Same reduction as raster_to_input, split so decode and resize are timed apart
+            imageA = rasterA.read_overview(overview_factor(rasterA.shape, img_size))
+            imageB = rasterB.read_overview(overview_factor(rasterB.shape, img_size))
+        
+        with timer.stage("preprocess"):
+            tensorA = resize_to_input(imageA, img_size, device)
+            tensorB = resize_to_input(imageB, img_size, device)
+        
+        report(progress_callback, "forward", 0, 1)
+        with torch.no_grad():
+            with timer.stage("forward"):
+                logits = model(tensorA, tensorB)
+                prob_map = torch.sigmoid(logits).squeeze().cpu().numpy()
+            report(progress_callback, "forward", 1, 1)
+            check_cancelled(cancel_check)
     
-    with torch.no_grad():
-        logits = model(tensorA, tensorB)
-        prob_map = torch.sigmoid(logits).squeeze().cpu().numpy()
-        change_mask = (prob_map > 0.5).astype(np.uint8) * 255
+    with timer.stage("quantize"):
+        prob_map = quantize_probabilities(prob_map)
+    return prob_map, (rasterA.shape[1], rasterA.shape[0])
+
+
+def predict_to_geotiff(imgA, imgB, output_path, model_path=None, device=None, tile_size=512, overlap=32,
+                       batch_size=4, precision="fp32", scaling=None, threshold=0.5, keep_mask=False,
+                       prescreen=None, features=None, progress_callback=None, cancel_check=None,
+                       timer=NULL_TIMER):
+    # Streams the thresholded tiled prediction straight into a georeferenced, tiled
+    # GeoTIFF without holding the full probability map. With keep_mask the binary
+    # mask is also collected (for vectorization) and returned with the georeference.
+    device = resolve_device(device)
+    report(progress_callback, "load")
+    with timer.stage("load"):
+        model = model_registry.get(model_path, device, optimized=features is None, precision=precision)
     
-    change_mask = cv2.resize(change_mask, (1024, 1024), interpolation=cv2.INTER_CUBIC)
+    report(progress_callback, "preprocess")
+    with timer.stage("decode"):
+        try:
+            rasterA = open_raster(imgA, cache=False, scaling=scaling)
+            rasterB = open_raster(imgB, cache=False, scaling=scaling)
+        except Exception as e:
+            raise Exception(f"Failed to open images: {str(e)}")
+        georef = read_georeference(rasterA)
+    baseline = None
+    if features is not None:
+        with timer.stage("features"):
+            baseline = features.baseline(rasterA, model_path, device, precision, scaling, tile_size)
+    if prescreen is not None:
+        prescreen.prepare(model, rasterA, rasterB, device, timer)
+    h, w = rasterA.shape[:2]
+    mask = np.zeros((h, w), dtype=np.uint8) if keep_mask else None
     
-    result_img = Image.fromarray(change_mask)
-    result_img.save(output_path)
+    def rows():
+        bands = iter_tiled_logits(model, rasterA, rasterB, tile_size, overlap, batch_size, device,
+                                  progress_callback=progress_callback, cancel_check=cancel_check, timer=timer,
+                                  prescreen=prescreen, baseline=baseline)
+        for y0, y1, band in bands:
+            with timer.stage("threshold"):
+                block = mask_from_probabilities(torch.sigmoid(torch.from_numpy(band)).numpy(), threshold)
+            if mask is not None:
+                mask[y0:y1] = block
+            yield block
     
-    return result_img
\ No newline at end of file
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    write_mask_tiff(output_path, rows(), w, h, threshold, georef)
+    report(progress_callback, "save")
+    return mask, georef
\ No newline at end of file
@@ -0,0 +1,43 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def to_input_tensor(images, device="cpu"):
+    # images: uint8 array of shape (N, H, W, 3) or (H, W, 3)
+    batch = np.asarray(images)
+    if batch.ndim == 3:
+        batch = batch[None]
+    tensor = torch.from_numpy(np.ascontiguousarray(batch)).to(device)
+    tensor = tensor.permute(0, 3, 1, 2).float().div_(255.0)
+    mean = torch.from_numpy(MEAN).to(tensor.device).view(1, 3, 1, 1)
+    std = torch.from_numpy(STD).to(tensor.device).view(1, 3, 1, 1)
+    return tensor.sub_(mean).div_(std)
+
+
+def resize_to_input(image, img_size, device="cpu"):
+    # Antialiased bilinear resize on the normalized tensor; it is linear, so this
+    # matches resizing the uint8 image first up to rounding.
+    tensor = to_input_tensor(image, device)
+    if tensor.shape[-2:] != (img_size, img_size):
+        tensor = F.interpolate(tensor, size=(img_size, img_size), mode="bilinear",
+                               align_corners=False, antialias=True)
+    return tensor
+
+
+# Recorded in probability cache keys, so maps made with another downsampling are not reused
+INPUT_DOWNSAMPLING = "area-overview"
+
+
+def overview_factor(shape, img_size):
+    # Integer reduction applied through the raster's area-averaged overview before the
+    # final resize, so large scenes are never decoded at full size for a fixed-size input
+    return max(1, min(shape[:2]) // (4 * img_size))
+
+
+def raster_to_input(raster, img_size, device="cpu"):
+    # The one path from a Raster to a fixed-size model input, shared by every entry point
+    return resize_to_input(raster.read_overview(overview_factor(raster.shape, img_size)), img_size, device)
@@ -0,0 +1,77 @@
+import numpy as np
+
+SKIP_LOGIT = -20.0
+
+
+def tile_change_scores(tiles_a, tiles_b, cell=16):
+    # Normalized radiometric difference: each tile is averaged over cell x cell blocks,
+    # standardized per channel (removing global illumination and contrast shifts) and
+    # scored by the largest block difference, so one changed building is enough to keep it.
+    a = np.asarray(tiles_a, dtype=np.float32)
+    b = np.asarray(tiles_b, dtype=np.float32)
+    n, h, w, c = a.shape
+    gh, gw = h // cell, w // cell
+    a = a[:, :gh * cell, :gw * cell].reshape(n, gh, cell, gw, cell, c).mean(axis=(2, 4))
+    b = b[:, :gh * cell, :gw * cell].reshape(n, gh, cell, gw, cell, c).mean(axis=(2, 4))
+    a = (a - a.mean(axis=(1, 2), keepdims=True)) / (a.std(axis=(1, 2), keepdims=True) + 1.0)
+    b = (b - b.mean(axis=(1, 2), keepdims=True)) / (b.std(axis=(1, 2), keepdims=True) + 1.0)
+    return np.abs(a - b).mean(axis=3).max(axis=(1, 2))
+
+
+class TilePrescreen:
+    # Tiles scoring below threshold are written as "no change" without running the model.
+    # Lower thresholds are more conservative.
+    # Timer stage around the tiled pass; only multi-stage screens have one
+    stage = None
+
+    def __init__(self, threshold=1.0, cell=16):
+        self.threshold = threshold
+        self.cell = cell
+        self.total = 0
+        self.skipped = 0
+        self.skipped_windows = []
+
+    def prepare(self, model, imgA, imgB, device, timer):
+        pass
+
+    def scores(self, tiles_a, tiles_b, windows):
+        return tile_change_scores(tiles_a, tiles_b, self.cell)
+
+    def select(self, tiles_a, tiles_b, windows):
+        # windows are the (y0, y1, x0, x1) image areas of the tiles; returns a keep mask
+        keep = self.scores(tiles_a, tiles_b, windows) >= self.threshold
+        self.total += len(keep)
+        self.skipped += int((~keep).sum())
+        self.skipped_windows.extend(window for window, k in zip(windows, keep) if not k)
+        return keep
+
+    def fill(self, windows, tile_size):
+        # Logits for pixels that only skipped tiles cover
+        return np.full((len(windows), tile_size, tile_size), SKIP_LOGIT, dtype=np.float32)
+
+    def skipped_fraction(self):
+        return self.skipped / self.total if self.total else 0.0
+
+    def reset(self):
+        self.total = 0
+        self.skipped = 0
+        self.skipped_windows = []
+
+    def key(self):
+        return (self.threshold, self.cell)
+
+
+def skipped_positive_fraction(label, windows, image_shape):
+    # Share of labelled change pixels that fell inside skipped tiles: an upper bound
+    # on the recall the pre-screen can have cost on this image.
+    positives = np.asarray(label) > 0
+    total = int(positives.sum())
+    if not total:
+        return 0.0, 0
+    sy = positives.shape[0] / image_shape[0]
+    sx = positives.shape[1] / image_shape[1]
+    covered = np.zeros(positives.shape, dtype=bool)
+    for y0, y1, x0, x1 in windows:
+        covered[round(y0 * sy):round(y1 * sy), round(x0 * sx):round(x1 * sx)] = True
+    lost = int((positives & covered).sum())
+    return lost / total, lost
\ No newline at end of file
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+import numpy as np
+from .disk_cache import DiskIndex, atomic_write, payload_key
+from .radiometry import DEFAULT_SCALING
+from .raster import Raster
+from .paths import default_cache_dir, default_model_path
+
+HASH_CHUNK = 1 << 20
+
+
+def quantize_probabilities(prob_map):
+    # Stored and thresholded as uint8 so cache hits and fresh runs give identical masks
+    if prob_map.dtype == np.uint8:
+        return prob_map
+    out = np.empty(prob_map.shape, dtype=np.uint8)
+    for y in range(0, prob_map.shape[0], 1024):
+        np.rint(prob_map[y:y + 1024] * 255.0, out=out[y:y + 1024], casting="unsafe")
+    return out
+
+
+class ProbabilityCache:
+    def __init__(self, directory=None, max_bytes=2 << 30):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._digests = {}
+        self._disk = DiskIndex(self.directory, ".npz")
+        self._lock = threading.Lock()
+
+    def file_digest(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._digests.get(stamp)
+        if digest is None:
+            h = hashlib.blake2b(digest_size=16)
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(HASH_CHUNK), b""):
+                    h.update(block)
+            digest = h.hexdigest()
+            with self._lock:
+                self._digests[stamp] = digest
+        return digest
+
+    def source_digest(self, source):
+        if isinstance(source, Raster):
+            if source.path and os.path.isfile(source.path):
+                return self.file_digest(source.path)
+            source = getattr(source, "array", None)
+            if source is None:
+                return None
+        if isinstance(source, np.ndarray):
+            h = hashlib.blake2b(digest_size=16)
+            h.update(str((source.shape, source.dtype.str)).encode())
+            h.update(np.ascontiguousarray(source).data)
+            return h.hexdigest()
+        return self.file_digest(source)
+
+    def weights_digest(self, model_path=None, precision="fp32"):
+        # INT8 runs load the quantized export, which can be rebuilt while the .pth stays the same
+        from .registry import artifact_paths
+
+        model_path = model_path or default_model_path()
+        digest = self.file_digest(model_path)
+        if precision == "int8":
+            digest += ":" + self.file_digest(artifact_paths(model_path)["int8"])
+        return digest
+
+    def key_for(self, imgA, imgB, model_path=None, precision="fp32", scaling=None, **config):
+        # None when a source cannot be fingerprinted; such runs are simply not cached
+        digests = [self.source_digest(imgA), self.source_digest(imgB)]
+        if None in digests:
+            return None
+        scalings = [img.scaling if isinstance(img, Raster) else scaling or DEFAULT_SCALING for img in (imgA, imgB)]
+        payload = {
+            "before": digests[0],
+            "after": digests[1],
+            "weights": self.weights_digest(model_path, precision),
+            "precision": precision,
+            "scaling": [list(s.key()) for s in scalings],
+            "config": config,
+        }
+        return payload_key(payload)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".npz")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                prob_map, size = data["prob"], tuple(int(v) for v in data["size"])
+        except (OSError, KeyError, ValueError):
+            return None
+        self._disk.touch(path)
+        return prob_map, size
+
+    def put(self, key, prob_map, size):
+        path = self._path(key)
+        atomic_write(path, lambda f: np.savez(f, prob=quantize_probabilities(prob_map), size=np.asarray(size)))
+        self._disk.add(path)
+        self.evict()
+
+    def size(self):
+        return self._disk.total()
+
+    def evict(self):
+        self._disk.evict(self.max_bytes)
+
+    def clear(self):
+        self._disk.clear()
+
+probability_cache = ProbabilityCache()
\ No newline at end of file
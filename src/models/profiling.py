@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+import threading
+import time
+import torch
+from torch.nn.modules.module import register_module_forward_hook, register_module_forward_pre_hook
+from . import timing
+
+
+class Profiler:
+    # Opt-in instrumentation: forward hooks on every module, the timing stages of the
+    # prediction code and each torch.cat with the bytes it allocates, recorded as
+    # Chrome trace spans. Nothing is hooked or patched until start().
+    def __init__(self):
+        self.events = []
+        self.active = False
+        self._names = {}
+        self._handles = []
+        self._local = threading.local()
+        self._cat = None
+        self._origin = time.perf_counter()
+
+    def start(self):
+        if self.active:
+            return self
+        self._handles = [register_module_forward_pre_hook(self._pre_hook),
+                         register_module_forward_hook(self._post_hook)]
+        self._cat = torch.cat
+        torch.cat = self._traced_cat
+        timing.tracer = self
+        self.active = True
+        return self
+
+    def stop(self):
+        if not self.active:
+            return self
+        timing.tracer = None
+        torch.cat = self._cat
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        self.active = False
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def clear(self):
+        self.events = []
+        self._origin = time.perf_counter()
+
+    def add_span(self, name, category, start, end, args=None):
+        event = {
+            "name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+            "ts": (start - self._origin) * 1e6, "dur": (end - start) * 1e6,
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _name(self, module):
+        name = self._names.get(id(module))
+        if name is None:
+            # First call on a model: name its whole tree, e.g. SNUNet_ECAM.conv0_4.conv1
+            root = type(module).__name__
+            for path, child in module.named_modules():
+                self._names.setdefault(id(child), f"{root}.{path}" if path else root)
+            name = self._names[id(module)]
+        return name
+
+    def _pre_hook(self, module, inputs):
+        self._stack().append((self._name(module), time.perf_counter()))
+
+    def _post_hook(self, module, inputs, output):
+        stack = self._stack()
+        if stack:
+            name, start = stack.pop()
+            self.add_span(name, "module", start, time.perf_counter())
+
+    def _traced_cat(self, tensors, *args, **kwargs):
+        start = time.perf_counter()
+        out = self._cat(tensors, *args, **kwargs)
+        stack = self._stack()
+        caller = sys._getframe(1)
+        self.add_span("torch.cat", "cat", start, time.perf_counter(), {
+            "bytes": out.numel() * out.element_size(),
+            "shape": list(out.shape),
+            "module": stack[-1][0] if stack else None,
+            "line": f"{os.path.basename(caller.f_code.co_filename)}:{caller.f_lineno}",
+        })
+        return out
+
+    def trace(self):
+        return {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+    def write_trace(self, path):
+        # Opens in chrome://tracing and ui.perfetto.dev
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f)
+
+    def summary(self):
+        rows = {}
+        for event in self.events:
+            if event["cat"] == "cat":
+                # One row per call site, e.g. the five-way concatenation feeding conv0_4
+                key = ("cat", f"torch.cat at {event['args']['line']}")
+            else:
+                key = (event["cat"], event["name"])
+            row = rows.setdefault(key, {"category": key[0], "name": key[1], "calls": 0, "ms": 0.0, "bytes": 0})
+            row["calls"] += 1
+            row["ms"] += event["dur"] / 1000
+            row["bytes"] += event.get("args", {}).get("bytes", 0)
+        return sorted(rows.values(), key=lambda row: row["ms"], reverse=True)
+
+    def format_summary(self, top=30):
+        # Module times include their children
+        lines = [f"{'category':8} {'name':48} {'calls':>6} {'total ms':>10} {'mean ms':>9} {'MB':>9}"]
+        for row in self.summary()[:top]:
+            lines.append(f"{row['category']:8} {row['name'][-48:]:48} {row['calls']:6d} {row['ms']:10.1f} "
+                         f"{row['ms'] / row['calls']:9.2f} {row['bytes'] / 2 ** 20:9.1f}")
+        return "\n".join(lines)
+
+
+def profiling_active():
+    return timing.tracer is not None
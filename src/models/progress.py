@@ -0,0 +1,15 @@
+STAGES = ("load", "preprocess", "forward", "postprocess", "save")
+
+
+class PredictionCancelled(Exception):
+    pass
+
+
+def report(progress_callback, stage, done=0, total=1):
+    if progress_callback is not None:
+        progress_callback(stage, done, total)
+
+
+def check_cancelled(cancel_check):
+    if cancel_check is not None and cancel_check():
+        raise PredictionCancelled("Prediction cancelled")
@@ -0,0 +1,103 @@
+import copy
+import os
+import time
+from contextlib import ExitStack
+import numpy as np
+import torch
+from PIL import Image
+from .batch import chunked, list_images, open_pair, predict_probabilities, to_mask
+from .export import load_fp32_model
+from .metrics import add_confusion, confusion, scores
+from .registry import artifact_paths, model_registry, select_quantized_engine
+
+
+def _open_chunk(rasters, chunk):
+    # Each Raster is entered on the stack, so a chunk closes its files however it exits
+    pairs = []
+    for _, before_path, after_path in chunk:
+        rasterA, rasterB = open_pair(before_path, after_path)
+        pairs.append((rasters.enter_context(rasterA), rasters.enter_context(rasterB)))
+    return zip(*pairs)
+
+
+def quantize_model(model_path, calibration_pairs, img_size=256, batch_size=4, max_pairs=32):
+    from torch.ao.quantization import get_default_qconfig
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+    try:
+        from torch.ao.quantization import get_default_qconfig_mapping
+    except ImportError:
+        get_default_qconfig_mapping = None
+
+    if not calibration_pairs:
+        raise Exception("Static quantization needs at least one calibration pair")
+
+    engine = select_quantized_engine()
+    model = copy.deepcopy(load_fp32_model(model_path))
+    example = (torch.randn(1, 3, img_size, img_size), torch.randn(1, 3, img_size, img_size))
+    if get_default_qconfig_mapping is not None:
+        prepared = prepare_fx(model, get_default_qconfig_mapping(engine), example)
+    else:
+        # torch 1.12 only has the qconfig dict API, which takes no example inputs
+        prepared = prepare_fx(model, {"": get_default_qconfig(engine)})
+
+    for chunk in chunked(calibration_pairs[:max_pairs], batch_size):
+        with ExitStack() as rasters:
+            imagesA, imagesB = _open_chunk(rasters, chunk)
+            predict_probabilities(prepared, imagesA, imagesB, img_size=img_size)
+
+    quantized = convert_fx(prepared)
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(quantized, example))
+
+    path = artifact_paths(model_path)["int8"]
+    torch.jit.save(frozen, path)
+    model_registry.evict(model_path)
+    return path
+
+
+def evaluate(model, pairs, label_dir, img_size=256, batch_size=4, threshold=0.5):
+    labels = list_images(label_dir)
+    pairs = [pair for pair in pairs if pair[0] in labels]
+    if not pairs:
+        raise Exception(f"No labelled pairs found in {label_dir}")
+
+    # TorchScript specializes on the first calls, keep that out of the timings
+    warmup = torch.zeros(batch_size, 3, img_size, img_size)
+    with torch.no_grad():
+        for _ in range(2):
+            model(warmup, warmup)
+
+    totals = {}
+    forward_seconds = 0.0
+    for chunk in chunked(pairs, batch_size):
+        with ExitStack() as rasters:
+            imagesA, imagesB = _open_chunk(rasters, chunk)
+            start = time.perf_counter()
+            prob_maps = predict_probabilities(model, imagesA, imagesB, img_size=img_size)
+            forward_seconds += time.perf_counter() - start
+        for (name, _, _), prob_map in zip(chunk, prob_maps):
+            label = np.asarray(Image.open(labels[name]).convert("L"))
+            mask = np.asarray(to_mask(prob_map, (label.shape[1], label.shape[0]), threshold))
+            add_confusion(totals, confusion(mask, label))
+
+    result = scores(totals)
+    result["pairs"] = len(pairs)
+    result["seconds_per_pair"] = forward_seconds / len(pairs)
+    return result
+
+
+def compare_precisions(model_path, pairs, label_dir, img_size=256, batch_size=4):
+    report = {
+        "fp32": evaluate(model_registry.get(model_path, "cpu", optimized=False), pairs, label_dir,
+                         img_size, batch_size),
+        "int8": evaluate(model_registry.get(model_path, "cpu", precision="int8"), pairs, label_dir,
+                         img_size, batch_size),
+    }
+    report["delta"] = {key: report["int8"][key] - report["fp32"][key]
+                       for key in ("precision", "recall", "f1", "iou")}
+    report["speedup"] = report["fp32"]["seconds_per_pair"] / report["int8"]["seconds_per_pair"]
+    report["size_mb"] = {
+        "fp32": os.path.getsize(model_path) / 2 ** 20,
+        "int8": os.path.getsize(artifact_paths(model_path)["int8"]) / 2 ** 20,
+    }
+    return report
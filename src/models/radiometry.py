@@ -0,0 +1,102 @@
+import numpy as np
+
+SCALING_MODES = ("minmax", "percentile", "bitdepth")
+STATS_BLOCK_VALUES = 1 << 22
+PERCENTILE_SAMPLES = 1 << 20
+CHUNK_VALUES = 1 << 20
+
+
+class Scaling:
+    def __init__(self, mode="minmax", low_percentile=2.0, high_percentile=98.0, bit_depth=16):
+        if mode not in SCALING_MODES:
+            raise ValueError(f"Unknown scaling mode: {mode}")
+        self.mode = mode
+        self.low_percentile = low_percentile
+        self.high_percentile = high_percentile
+        self.bit_depth = bit_depth
+
+    def key(self):
+        return (self.mode, self.low_percentile, self.high_percentile, self.bit_depth)
+
+    def __eq__(self, other):
+        return isinstance(other, Scaling) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return f"Scaling{self.key()}"
+
+
+DEFAULT_SCALING = Scaling()
+
+
+def iter_blocks(read_rows, height, width, bands=3):
+    # read_rows(y0, y1) -> array; blocks are sized to hold ~STATS_BLOCK_VALUES values
+    rows = max(1, STATS_BLOCK_VALUES // max(1, width * bands))
+    for y in range(0, height, rows):
+        yield read_rows(y, min(height, y + rows))
+
+
+def value_range(blocks, dtype, scaling=DEFAULT_SCALING):
+    dtype = np.dtype(dtype)
+    if scaling.mode == "bitdepth":
+        return 0.0, float(2 ** scaling.bit_depth - 1)
+
+    if scaling.mode == "minmax":
+        low, high = np.inf, -np.inf
+        for block in blocks:
+            if block.size:
+                low = min(low, float(np.nanmin(block)))
+                high = max(high, float(np.nanmax(block)))
+        return (low, high) if low <= high else (0.0, 0.0)
+
+    quantiles = (scaling.low_percentile, scaling.high_percentile)
+    if dtype.kind in "ui" and dtype.itemsize <= 2:
+        # Exact percentiles from a streamed histogram over the whole integer range
+        offset = int(np.iinfo(dtype).min)
+        counts = np.zeros(2 ** (8 * dtype.itemsize), dtype=np.int64)
+        for block in blocks:
+            values = block.ravel().astype(np.int64) - offset
+            counts += np.bincount(values, minlength=counts.size)
+        cumulative = np.cumsum(counts)
+        if cumulative[-1] == 0:
+            return 0.0, 0.0
+        targets = [q / 100.0 * (cumulative[-1] - 1) for q in quantiles]
+        low, high = (float(np.searchsorted(cumulative, t, side="right") + offset) for t in targets)
+        return low, high
+
+    samples = []
+    for block in blocks:
+        step = max(1, int(np.sqrt(block.size / max(1, PERCENTILE_SAMPLES // 64))))
+        samples.append(block[::step, ::step].ravel().astype(np.float64))
+    if not samples:
+        return 0.0, 0.0
+    low, high = np.nanpercentile(np.concatenate(samples), quantiles)
+    return float(low), float(high)
+
+
+def scale_to_uint8(image, low, high, out=None):
+    # Linear stretch of [low, high] onto 0..255, a chunk of rows at a time, so the
+    # only float temporary is one chunk rather than a full-size copy.
+    if out is None:
+        out = np.empty(image.shape, dtype=np.uint8)
+    if high <= low:
+        out[...] = 0
+        return out
+
+    h = image.shape[0]
+    row_values = max(1, image[:1].size)
+    rows = max(1, CHUNK_VALUES // row_values)
+    buffer = np.empty((min(rows, h),) + image.shape[1:], dtype=np.float32)
+    scale = 255.0 / (high - low)
+    for y in range(0, h, rows):
+        n = min(rows, h - y)
+        chunk = buffer[:n]
+        np.copyto(chunk, image[y:y + n], casting="unsafe")
+        chunk -= low
+        chunk *= scale
+        np.clip(chunk, 0, 255, out=chunk)
+        np.rint(chunk, out=chunk)
+        np.copyto(out[y:y + n], chunk, casting="unsafe")
+    return out
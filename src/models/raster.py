@@ -0,0 +1,236 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from .radiometry import DEFAULT_SCALING, iter_blocks, scale_to_uint8, value_range
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+
+def _import_rasterio():
+    # GDAL is slow to load, so rasterio is only imported once a TIFF needs it
+    try:
+        import rasterio
+        import rasterio.enums
+        import rasterio.windows
+    except ImportError:
+        return None
+    return rasterio
+
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+# Overview rows produced per band when downsampling a memory-mapped raster
+OVERVIEW_BAND_ROWS = 64
+
+
+def _to_rgb(image):
+    if image.ndim == 2:
+        image = image[:, :, None]
+    if image.shape[2] == 1:
+        return np.repeat(image, 3, axis=2)
+    if image.shape[2] == 2:
+        return np.repeat(image[:, :, :1], 3, axis=2)
+    return image[:, :, :3]
+
+
+class Raster:
+    def __init__(self, path, height, width, dtype, scaling=None):
+        self.path = path
+        self.height = height
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        self.scaling = scaling or DEFAULT_SCALING
+        self._lock = threading.Lock()
+        self._range = None
+
+    @property
+    def shape(self):
+        return (self.height, self.width, 3)
+
+    def overview_size(self, factor):
+        return (math.ceil(self.height / factor), math.ceil(self.width / factor))
+
+    def read_window(self, y0, y1, x0, x1, out=None):
+        with self._lock:
+            window = self._read(y0, y1, x0, x1)
+        return self._to_uint8(_to_rgb(window), out)
+
+    def read(self):
+        return self.read_window(0, self.height, 0, self.width)
+
+    def read_overview(self, factor):
+        # Downsampled copy with ceil(h / factor) x ceil(w / factor) pixels
+        if factor == 1:
+            return self.read()
+        with self._lock:
+            overview = self._read_overview(factor)
+        return self._to_uint8(_to_rgb(overview))
+
+    def _to_uint8(self, window, out=None):
+        if window.dtype == np.uint8:
+            if out is None:
+                return np.ascontiguousarray(window)
+            np.copyto(out, window)
+            return out
+        low, high = self.value_range()
+        return scale_to_uint8(window, low, high, out)
+
+    def value_range(self):
+        # Scene-wide stretch limits, so every window is scaled the same way
+        if self._range is None:
+            with self._lock:
+                blocks = iter_blocks(lambda y0, y1: _to_rgb(self._read(y0, y1, 0, self.width)),
+                                     self.height, self.width)
+                self._range = value_range(blocks, self.dtype, self.scaling)
+        return self._range
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArrayRaster(Raster):
+    def __init__(self, path, array, scaling=None):
+        super().__init__(path, array.shape[0], array.shape[1], array.dtype, scaling)
+        self.array = array
+        self.lazy = isinstance(array, np.memmap)
+
+    def _read(self, y0, y1, x0, x1):
+        return self.array[y0:y1, x0:x1]
+
+    def _read_overview(self, factor):
+        h, w = self.overview_size(factor)
+        if not self.lazy:
+            return cv2.resize(np.ascontiguousarray(_to_rgb(self.array)), (w, h), interpolation=cv2.INTER_AREA)
+        # Area-averaged like the in-memory case, but over bands of rows so only one band
+        # of the memory map is paged in at a time
+        band = factor * OVERVIEW_BAND_ROWS
+        out = None
+        for y in range(0, self.height, band):
+            block = np.ascontiguousarray(_to_rgb(self.array[y:y + band]))
+            rows = cv2.resize(block, (w, math.ceil(block.shape[0] / factor)), interpolation=cv2.INTER_AREA)
+            if out is None:
+                out = np.empty((h,) + rows.shape[1:], dtype=rows.dtype)
+            out[y // factor:y // factor + rows.shape[0]] = rows
+        return out
+
+
+class RasterioRaster(Raster):
+    def __init__(self, path, scaling=None):
+        self.rasterio = _import_rasterio()
+        self.dataset = self.rasterio.open(path)
+        super().__init__(path, self.dataset.height, self.dataset.width, self.dataset.dtypes[0], scaling)
+        self.indexes = list(range(1, min(3, self.dataset.count) + 1))
+        self.profile = self.dataset.profile
+
+    def _read(self, y0, y1, x0, x1):
+        data = self.dataset.read(self.indexes, window=self.rasterio.windows.Window(x0, y0, x1 - x0, y1 - y0))
+        return np.moveaxis(data, 0, -1)
+
+    def _read_overview(self, factor):
+        h, w = self.overview_size(factor)
+        data = self.dataset.read(self.indexes, out_shape=(len(self.indexes), h, w),
+                                 resampling=self.rasterio.enums.Resampling.average)
+        return np.moveaxis(data, 0, -1)
+
+    def close(self):
+        self.dataset.close()
+
+
+def _memmap_tiff(path):
+    if tifffile is None:
+        return None
+    try:
+        array = tifffile.memmap(path, mode='r')
+    except (ValueError, OSError):
+        return None
+    if array.ndim == 3 and array.shape[0] in (3, 4) and array.shape[2] not in (3, 4):
+        # planar configuration: bands first
+        array = np.moveaxis(array, 0, -1)
+    return array
+
+
+def _decode(path):
+    _, ext = os.path.splitext(path)
+    if ext.lower() in TIFF_EXTENSIONS:
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is not None and image.ndim == 3:
+            image = np.ascontiguousarray(image[:, :, 2::-1])
+    else:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is not None:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if image is None:
+        raise ValueError(f"Failed to read image: {path}")
+    return image
+
+
+def load_raster(path, scaling=None):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Image file not found: {path}")
+
+    _, ext = os.path.splitext(path)
+    if ext.lower() in TIFF_EXTENSIONS:
+        array = _memmap_tiff(path)
+        if array is not None:
+            return ArrayRaster(path, array, scaling)
+        if _import_rasterio() is not None:
+            try:
+                return RasterioRaster(path, scaling)
+            except Exception:
+                pass
+    return ArrayRaster(path, _decode(path), scaling)
+
+
+class RasterCache:
+    def __init__(self, max_rasters=4):
+        self.max_rasters = max_rasters
+        self._rasters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, scaling=None):
+        path = os.path.abspath(path)
+        scaling = scaling or DEFAULT_SCALING
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise FileNotFoundError(f"Image file not found: {path}")
+        key = (path, stat.st_mtime_ns, stat.st_size, scaling.key())
+
+        with self._lock:
+            raster = self._rasters.get(key)
+            if raster is not None:
+                self._rasters.move_to_end(key)
+                return raster
+
+        raster = load_raster(path, scaling)
+        with self._lock:
+            self._rasters[key] = raster
+            # Evicted rasters may still be on screen, so they are left to close when released
+            while len(self._rasters) > self.max_rasters:
+                self._rasters.popitem(last=False)
+        return raster
+
+    def clear(self):
+        with self._lock:
+            self._rasters.clear()
+
+
+raster_cache = RasterCache()
+
+
+def open_raster(source, cache=True, scaling=None):
+    if isinstance(source, Raster):
+        return source
+    if isinstance(source, np.ndarray):
+        return ArrayRaster(None, source, scaling)
+    return raster_cache.get(source, scaling) if cache else load_raster(source, scaling)
@@ -0,0 +1,163 @@
+import os
+import threading
+from collections import OrderedDict
+import torch
+from .change_detection_model import SNUNet_ECAM
+from .paths import default_model_path
+from .profiling import profiling_active
+
+
+def artifact_paths(model_path):
+    stem = os.path.splitext(os.path.abspath(model_path))[0]
+    return {
+        "torchscript": stem + ".torchscript.pt",
+        "onnx": stem + ".onnx",
+        "int8": stem + ".int8.torchscript.pt",
+    }
+
+
+def select_quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    engine = "fbgemm" if "fbgemm" in engines else "qnnpack"
+    torch.backends.quantized.engine = engine
+    return engine
+
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError:
+        return None
+    return onnxruntime
+
+
+def find_artifact(model_path, device, weights_mtime_ns, precision="fp32"):
+    # Optimized exports are only used while they are at least as new as the .pth
+    for kind, path in artifact_paths(model_path).items():
+        if (kind == "int8") != (precision == "int8"):
+            continue
+        if kind == "onnx" and (device != "cpu" or _import_onnxruntime() is None):
+            continue
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        if mtime >= weights_mtime_ns:
+            return (kind, path, mtime)
+    return None
+
+
+class OnnxModel:
+    def __init__(self, path):
+        onnxruntime = _import_onnxruntime()
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+
+    def __call__(self, xA, xB):
+        logits = self.session.run(["logits"], {"before": xA.cpu().numpy(), "after": xB.cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+    def eval(self):
+        return self
+
+
+def resolve_device(device=None):
+    if device is None:
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    return str(device)
+
+
+class ModelRegistry:
+    def __init__(self, max_models=3):
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+
+    def key_for(self, model_path, device, optimized=True, precision="fp32"):
+        model_path = os.path.abspath(model_path)
+        try:
+            stat = os.stat(model_path)
+        except OSError as e:
+            raise Exception(f"Failed to load model from {model_path}: {str(e)}")
+        artifact = None
+        if precision == "int8":
+            if device != "cpu":
+                raise Exception("INT8 inference is only available on the CPU")
+            artifact = find_artifact(model_path, device, stat.st_mtime_ns, precision)
+            if artifact is None:
+                raise Exception(f"No up-to-date INT8 model for {model_path}; "
+                                f"run 'python -m models quantize' first")
+        elif precision != "fp32":
+            raise Exception(f"Unknown precision: {precision}")
+        elif optimized:
+            artifact = find_artifact(model_path, device, stat.st_mtime_ns)
+        return (model_path, stat.st_mtime_ns, stat.st_size, device, artifact)
+
+    def get(self, model_path=None, device=None, optimized=True, precision="fp32"):
+        if model_path is None:
+            model_path = default_model_path()
+        device = resolve_device(device)
+        # Layer hooks cannot see inside exported graphs, so profiling uses the eager model
+        optimized = optimized and not profiling_active()
+        key = self.key_for(model_path, device, optimized, precision)
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+
+            model = self._load(key[0], device, key[4])
+            # A rewritten .pth or export gets a new key, so drop stale entries for the same file
+            kind = key[4][0] if key[4] else None
+            for stale in [k for k in self._models
+                          if k[0] == key[0] and k[3] == device and (k[4][0] if k[4] else None) == kind]:
+                del self._models[stale]
+            self._models[key] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            return model
+
+    def _load(self, model_path, device, artifact=None):
+        if artifact is not None:
+            kind, path, _ = artifact
+            try:
+                if kind == "int8":
+                    select_quantized_engine()
+                if kind in ("torchscript", "int8"):
+                    return torch.jit.load(path, map_location=device).eval()
+                return OnnxModel(path)
+            except Exception as e:
+                raise Exception(f"Failed to load optimized model from {path}: {str(e)}")
+
+        model = SNUNet_ECAM(in_ch=3, out_ch=1)
+        try:
+            model.load_state_dict(torch.load(model_path, map_location=device))
+        except Exception as e:
+            raise Exception(f"Failed to load model from {model_path}: {str(e)}")
+        model.to(device)
+        model.eval()
+        return model
+
+    def is_cached(self, model_path, device=None, optimized=True, precision="fp32"):
+        try:
+            key = self.key_for(model_path, resolve_device(device), optimized, precision)
+        except Exception:
+            return False
+        with self._lock:
+            return key in self._models
+
+    def evict(self, model_path):
+        model_path = os.path.abspath(model_path)
+        with self._lock:
+            for key in [k for k in self._models if k[0] == model_path]:
+                del self._models[key]
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def __len__(self):
+        return len(self._models)
+
+
+model_registry = ModelRegistry()
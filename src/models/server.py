@@ -0,0 +1,277 @@
+import base64
+import io
+import json
+import queue
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import torch
+from PIL import Image
+from .geo import read_georeference
+from .mask_io import encode_mask, mask_from_probabilities, output_size
+from .predict import IMG_SIZE
+from .preprocess import raster_to_input
+from .raster import open_raster
+from .registry import model_registry, resolve_device
+
+DEFAULT_PORT = 8765
+# Writing files and loading weights are server-side settings; requests only get the mask back
+REJECTED_FIELDS = {
+    "output": "the mask is returned in the response",
+    "model": "the server uses the weights it was started with",
+}
+CONTENT_TYPES = {
+    ".png": "image/png",
+    ".tif": "image/tiff",
+    ".rle": "application/json",
+    ".geojson": "application/geo+json",
+}
+
+
+class ServerMetrics:
+    def __init__(self, window=2000):
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = {}
+        self.requests = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def record_batch(self, size, depth):
+        with self._lock:
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            self.max_depth = max(self.max_depth, depth)
+
+    def record_request(self, seconds, ok=True):
+        with self._lock:
+            self.requests += 1
+            if ok:
+                self.latencies.append(seconds)
+            else:
+                self.errors += 1
+
+    def snapshot(self, depth):
+        with self._lock:
+            latencies = np.array(self.latencies, dtype=np.float64)
+            batches = dict(sorted(self.batch_sizes.items()))
+            requests, errors, max_depth = self.requests, self.errors, self.max_depth
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if len(latencies) else (0.0, 0.0)
+        batched = sum(size * count for size, count in batches.items())
+        return {
+            "requests": requests,
+            "errors": errors,
+            "queue_depth": depth,
+            "max_queue_depth": max_depth,
+            "batch_sizes": {str(size): count for size, count in batches.items()},
+            "mean_batch_size": batched / sum(batches.values()) if batches else 0.0,
+            "latency_ms": {"p50": float(p50), "p99": float(p99), "samples": int(len(latencies))},
+        }
+
+
+class MicroBatcher:
+    # Groups concurrent requests for one model into a single forward pass. A batch runs
+    # as soon as max_batch inputs are waiting or the oldest has waited max_latency seconds.
+    def __init__(self, model_path=None, device="cpu", precision="fp32", max_batch=8, max_latency=0.01,
+                 metrics=None):
+        self.model_path = model_path
+        self.device = device
+        self.precision = precision
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.metrics = metrics or ServerMetrics()
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def submit(self, xA, xB):
+        # xA/xB: (1, 3, IMG_SIZE, IMG_SIZE) input tensors; resolves to the probability map
+        future = Future()
+        self._queue.put((time.perf_counter(), xA, xB, future))
+        return future
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        items = [first]
+        deadline = first[0] + self.max_latency
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while not self._stop.is_set():
+            items = self._collect()
+            if not items:
+                continue
+            self.metrics.record_batch(len(items), len(items) + self._queue.qsize())
+            try:
+                model = model_registry.get(self.model_path, self.device, precision=self.precision)
+                with torch.no_grad():
+                    logits = model(torch.cat([item[1] for item in items]), torch.cat([item[2] for item in items]))
+                    prob_maps = torch.sigmoid(logits[:, 0]).cpu().numpy()
+            except Exception as e:
+                for item in items:
+                    item[3].set_exception(e)
+                continue
+            for item, prob_map in zip(items, prob_maps):
+                item[3].set_result(prob_map)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class RequestError(Exception):
+    pass
+
+
+def _decode_image(data):
+    try:
+        return open_raster(np.array(Image.open(io.BytesIO(base64.b64decode(data))).convert("RGB")))
+    except Exception as e:
+        raise RequestError(f"Failed to decode image data: {str(e)}")
+
+
+class DetectionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, model_path=None, device=None, precision="fp32", max_batch=8, max_latency=0.01,
+                 scaling=None, verbose=False):
+        self.model_path = model_path
+        self.device = resolve_device(device)
+        self.precision = precision
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.scaling = scaling
+        self.verbose = verbose
+        self.metrics = ServerMetrics()
+        self.serving = False
+        self.batcher = MicroBatcher(model_path, self.device, precision, max_batch, max_latency, self.metrics)
+        super().__init__(address, DetectionHandler)
+
+    def depth(self):
+        return self.batcher.depth()
+
+    def load(self):
+        # Keeps the weights resident before the first request arrives
+        model_registry.get(self.model_path, self.device, precision=self.precision)
+
+    def predict(self, request):
+        # request: before/after file paths, or before_data/after_data base64 encoded images
+        for field, reason in REJECTED_FIELDS.items():
+            if field in request:
+                raise RequestError(f"'{field}' is not accepted: {reason}")
+        images = []
+        try:
+            for side in ("before", "after"):
+                if f"{side}_data" in request:
+                    images.append(_decode_image(request[f"{side}_data"]))
+                elif side in request:
+                    try:
+                        images.append(open_raster(request[side], cache=False, scaling=self.scaling))
+                    except Exception as e:
+                        raise RequestError(f"Failed to open image {request[side]}: {str(e)}")
+                else:
+                    raise RequestError(f"Missing '{side}' path or '{side}_data'")
+            imgA, imgB = images
+            if imgA.shape != imgB.shape:
+                raise RequestError(f"Image sizes differ: {imgA.shape[:2]} vs {imgB.shape[:2]}")
+
+            # Same overview and resize as predict_changes and the batch pipeline, so a pair gets
+            # the same mask whichever entry point runs it
+            tensorA = raster_to_input(imgA, IMG_SIZE, self.device)
+            tensorB = raster_to_input(imgB, IMG_SIZE, self.device)
+        finally:
+            for image in images:
+                image.close()
+        prob_map = self.batcher.submit(tensorA, tensorB).result()
+
+        threshold = float(request.get("threshold", 0.5))
+        size = output_size((imgA.shape[1], imgA.shape[0]), float(request.get("scale", 1.0)))
+        return mask_from_probabilities(prob_map, threshold, size), threshold
+
+    def serve_forever(self, poll_interval=0.5):
+        self.serving = True
+        super().serve_forever(poll_interval)
+
+    def close(self):
+        # shutdown() waits for the serve loop, so it would block forever if none was started
+        if self.serving:
+            self.shutdown()
+        self.server_close()
+        self.batcher.close()
+
+
+class DetectionHandler(BaseHTTPRequestHandler):
+    def _send(self, status, body, content_type="application/json"):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok", "device": self.server.device, "precision": self.server.precision})
+        elif self.path == "/metrics":
+            self._send(200, self.server.metrics.snapshot(self.server.depth()))
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+        start = time.perf_counter()
+        # Only JSON bodies: browsers cannot send them cross-origin without a CORS preflight,
+        # which this server never answers
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self.server.metrics.record_request(time.perf_counter() - start, False)
+            self._send(415, {"error": "Content-Type must be application/json"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not isinstance(request, dict):
+                raise RequestError("Expected a JSON object")
+            fmt = "." + str(request.get("format", "png")).lstrip(".").lower()
+            if fmt not in CONTENT_TYPES:
+                raise RequestError(f"Unsupported format: {fmt}")
+            mask, threshold = self.server.predict(request)
+            georef = read_georeference(request.get("before")) if fmt in (".tif", ".geojson") else None
+            status, body, content_type = 200, encode_mask(mask, fmt, threshold, georef), CONTENT_TYPES[fmt]
+        except (RequestError, ValueError) as e:
+            status, body, content_type = 400, {"error": str(e)}, "application/json"
+        except Exception as e:
+            status, body, content_type = 500, {"error": str(e)}, "application/json"
+        self.server.metrics.record_request(time.perf_counter() - start, status == 200)
+        self._send(status, body, content_type)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def request_prediction(before, after, url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=60, **options):
+    # Minimal client: before/after are paths readable by the server; returns the response body
+    payload = json.dumps(dict(options, before=before, after=after)).encode()
+    request = urllib.request.Request(url.rstrip("/") + "/predict", data=payload,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
@@ -0,0 +1,44 @@
+import os
+import re
+import subprocess
+import sys
+
+# Modules that must stay out of the GUI's import path; they load in the background
+HEAVY_MODULES = ("torch", "torchvision", "onnxruntime", "rasterio", "sklearn", "matplotlib", "scipy")
+IMPORT_LINE = re.compile(r"import time:\s*(\d+) \|\s*(\d+) \| ( *)(\S+)")
+
+
+def measure_imports(module="ui.main_window", python=None):
+    # Runs a fresh interpreter with -X importtime so nothing is already cached
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    result = subprocess.run(
+        [python or sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=src_dir, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise Exception(f"Importing {module} failed: {lines[-1] if lines else result.returncode}")
+
+    cumulative = {}
+    top_level = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        seconds = int(match.group(2)) / 1e6
+        name = match.group(4)
+        cumulative[name] = seconds
+        if not match.group(3):
+            top_level.append((name, seconds))
+    return {
+        "module": module,
+        "seconds": sum(seconds for _, seconds in top_level),
+        "top_level": sorted(top_level, key=lambda item: item[1], reverse=True),
+        "slowest": sorted(cumulative.items(), key=lambda item: item[1], reverse=True),
+        "heavy": [name for name in HEAVY_MODULES if name in cumulative],
+    }
+
+
+def within_budget(report, budget):
+    return report["seconds"] <= budget and not report["heavy"]
\ No newline at end of file
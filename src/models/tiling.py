@@ -0,0 +1,179 @@
+import numpy as np
+import torch
+from .preprocess import to_input_tensor
+from .progress import report, check_cancelled
+from .timing import NULL_TIMER
+
+
+def tile_origins(length, tile_size, stride):
+    if length <= tile_size:
+        return [0]
+    origins = list(range(0, length - tile_size, stride))
+    origins.append(length - tile_size)
+    return origins
+
+
+def blend_window(tile_size, overlap):
+    # Flat in the middle, raised-cosine ramps over the overlap so that
+    # neighbouring tiles cross-fade instead of leaving seams.
+    ramp = np.ones(tile_size, dtype=np.float32)
+    if overlap > 0:
+        t = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+        edge = 0.5 - 0.5 * np.cos(np.pi * t)
+        ramp[:overlap] = edge
+        ramp[-overlap:] = np.minimum(ramp[-overlap:], edge[::-1])
+    ramp = np.maximum(ramp, 1e-3)
+    return np.outer(ramp, ramp)
+
+
+def image_shape(image):
+    return tuple(image.shape[:2])
+
+
+def read_window(image, y0, y1, x0, x1):
+    if hasattr(image, "read_window"):
+        return image.read_window(y0, y1, x0, x1)
+    return np.asarray(image[y0:y1, x0:x1])
+
+
+def _pad_tile(tile, tile_size):
+    h, w = tile.shape[:2]
+    if h == tile_size and w == tile_size:
+        return tile
+    return np.pad(tile, ((0, tile_size - h), (0, tile_size - w), (0, 0)), mode="symmetric")
+
+
+def _run_batch(model, tiles_a, tiles_b, device, timer=NULL_TIMER, windows=None, baseline=None):
+    if baseline is not None and hasattr(model, "encode"):
+        return _run_with_baseline(model, tiles_a, tiles_b, windows, device, baseline, timer)
+    with timer.stage("preprocess"):
+        xA = to_input_tensor(np.stack(tiles_a), device)
+        xB = to_input_tensor(np.stack(tiles_b), device)
+    with timer.stage("forward"), torch.no_grad():
+        logits = model(xA, xB)
+        return logits[:, 0].float().cpu().numpy()
+
+
+def _run_with_baseline(model, tiles_a, tiles_b, windows, device, baseline, timer=NULL_TIMER):
+    # Only baseline tiles not seen before go through the encoder on the A side
+    with timer.stage("features"):
+        featuresA = [baseline.get(window, device) for window in windows]
+    missing = [i for i, features in enumerate(featuresA) if features is None]
+    with timer.stage("preprocess"):
+        xB = to_input_tensor(np.stack(tiles_b), device)
+        xA = to_input_tensor(np.stack([tiles_a[i] for i in missing]), device) if missing else None
+    with timer.stage("forward"), torch.no_grad():
+        if missing:
+            encoded = model.encode(xA)
+            for j, i in enumerate(missing):
+                featuresA[i] = [f[j:j + 1] for f in encoded]
+        featuresA = [torch.cat(level, 0) for level in zip(*featuresA)]
+        logits = model.decode(featuresA, model.encode(xB))
+    with timer.stage("features"):
+        for j, i in enumerate(missing):
+            baseline.put(windows[i], [f[j:j + 1] for f in encoded])
+    return logits[:, 0].float().cpu().numpy()
+
+
+def _run_screened(model, tiles_a, tiles_b, windows, device, prescreen, timer=NULL_TIMER, baseline=None):
+    # Returns the logits of every tile and which of them the model actually ran on
+    with timer.stage("prescreen"):
+        run = prescreen.select(tiles_a, tiles_b, windows)
+    logits = prescreen.fill(windows, tiles_a[0].shape[0])
+    if run.any():
+        index = np.flatnonzero(run)
+        logits[index] = _run_batch(model, [tiles_a[i] for i in index], [tiles_b[i] for i in index], device, timer,
+                                   [windows[i] for i in index], baseline)
+    return logits, run
+
+
+def iter_tiled_logits(model, imgA, imgB, tile_size=256, overlap=32, batch_size=4, device="cpu",
+                      progress_callback=None, cancel_check=None, timer=NULL_TIMER, prescreen=None, baseline=None):
+    # baseline: BaselineFeatures for imgA, reusing its encoder features across runs
+    if tile_size % 16 != 0:
+        raise ValueError(f"Tile size must be a multiple of 16, got {tile_size}")
+    if not 0 <= overlap < tile_size:
+        raise ValueError(f"Overlap must be in [0, {tile_size}), got {overlap}")
+
+    h, w = image_shape(imgA)
+    if image_shape(imgB) != (h, w):
+        raise ValueError(f"Image sizes differ: {(h, w)} vs {image_shape(imgB)}")
+
+    stride = tile_size - overlap
+    ys = tile_origins(h, tile_size, stride)
+    xs = tile_origins(w, tile_size, stride)
+    window = blend_window(tile_size, overlap)
+
+    # Only one band of tile rows is held at a time: rows above the next
+    # tile row's origin can no longer receive contributions and are emitted.
+    band_h = min(tile_size, h)
+    acc = np.zeros((band_h, w), dtype=np.float32)
+    weight = np.zeros((band_h, w), dtype=np.float32)
+    # Skipped tiles carry no blend weight: their filled logits only show where no tile ran
+    fallback = np.zeros((band_h, w), dtype=np.float32) if prescreen is not None else None
+
+    total = len(ys) * len(xs)
+    processed = 0
+    report(progress_callback, "forward", processed, total)
+
+    for row, y in enumerate(ys):
+        th = min(tile_size, h - y)
+        for start in range(0, len(xs), batch_size):
+            check_cancelled(cancel_check)
+            batch_xs = xs[start:start + batch_size]
+            tiles_a, tiles_b = [], []
+            with timer.stage("decode"):
+                for x in batch_xs:
+                    tw = min(tile_size, w - x)
+                    tiles_a.append(_pad_tile(read_window(imgA, y, y + th, x, x + tw), tile_size))
+                    tiles_b.append(_pad_tile(read_window(imgB, y, y + th, x, x + tw), tile_size))
+            windows = [(y, y + th, x, min(x + tile_size, w)) for x in batch_xs]
+            if prescreen is not None:
+                logits, run = _run_screened(model, tiles_a, tiles_b, windows, device, prescreen, timer, baseline)
+            else:
+                logits, run = _run_batch(model, tiles_a, tiles_b, device, timer, windows, baseline), None
+            with timer.stage("blend"):
+                for i, (x, tile_logits) in enumerate(zip(batch_xs, logits)):
+                    tw = min(tile_size, w - x)
+                    if run is not None and not run[i]:
+                        fallback[:th, x:x + tw] = tile_logits[:th, :tw]
+                        continue
+                    wt = window[:th, :tw]
+                    acc[:th, x:x + tw] += tile_logits[:th, :tw] * wt
+                    weight[:th, x:x + tw] += wt
+            processed += len(batch_xs)
+            report(progress_callback, "forward", processed, total)
+
+        y_next = ys[row + 1] if row + 1 < len(ys) else h
+        done = y_next - y
+        if fallback is None:
+            yield y, y_next, acc[:done] / weight[:done]
+        else:
+            yield y, y_next, np.divide(acc[:done], weight[:done], out=fallback[:done].copy(),
+                                       where=weight[:done] > 0)
+
+        keep = band_h - done
+        acc[:keep] = acc[done:]
+        acc[keep:] = 0
+        weight[:keep] = weight[done:]
+        weight[keep:] = 0
+        if fallback is not None:
+            fallback[:keep] = fallback[done:]
+            fallback[keep:] = 0
+
+
+def predict_tiled(model, imgA, imgB, tile_size=256, overlap=32, batch_size=4, device="cpu", out=None,
+                  progress_callback=None, cancel_check=None, timer=NULL_TIMER, prescreen=None, baseline=None):
+    # Probability quantized to uint8 as in quantize_probabilities. Each finished band is
+    # converted as soon as it is emitted, so float32 is only held for the open tile row.
+    h, w = image_shape(imgA)
+    if out is None:
+        out = np.empty((h, w), dtype=np.uint8)
+    tiles = iter_tiled_logits(model, imgA, imgB, tile_size, overlap, batch_size, device,
+                              progress_callback=progress_callback, cancel_check=cancel_check, timer=timer,
+                              prescreen=prescreen, baseline=baseline)
+    for y0, y1, band in tiles:
+        with timer.stage("blend"):
+            prob = torch.sigmoid_(torch.from_numpy(band)).numpy()
+            np.rint(np.multiply(prob, 255.0, out=prob), out=out[y0:y1], casting="unsafe")
+    return out
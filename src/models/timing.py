@@ -0,0 +1,62 @@
+import time
+from contextlib import contextmanager
+
+# Set by models.profiling while a trace is recorded; every stage then also becomes a trace span
+tracer = None
+
+
+class StageTimer:
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        active = tracer
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.add(name, end - start)
+            if active is not None:
+                active.add_span(name, "stage", start, end)
+
+    def add(self, name, seconds):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def merge(self, other):
+        for name, seconds in other.totals.items():
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + other.counts[name]
+
+    def summary(self):
+        return {
+            name: {
+                "seconds": seconds,
+                "calls": self.counts[name],
+                "mean_ms": seconds / self.counts[name] * 1000,
+            }
+            for name, seconds in self.totals.items()
+        }
+
+
+class NullTimer:
+    @contextmanager
+    def stage(self, name):
+        active = tracer
+        if active is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            active.add_span(name, "stage", start, time.perf_counter())
+
+    def add(self, name, seconds):
+        pass
+
+
+NULL_TIMER = NullTimer()
@@ -3,21 +3,45 @@ import sys
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QPushButton, QLabel, QFileDialog, QTabWidget, 
                              QMessageBox, QProgressBar, QSplitter, QGroupBox,
-                             QLineEdit, QFrame, QStatusBar, QComboBox, QFormLayout)
+                             QLineEdit, QFrame, QStatusBar, QComboBox, QFormLayout,
+                             QCheckBox, QSpinBox, QSlider, QAction)
 from PyQt5.QtGui import QFont, QIcon, QPixmap
-from PyQt5.QtCore import Qt, QSize, QDir
+from PyQt5.QtCore import Qt, QSize, QDir, QTimer
 
-from .image_viewer import ImageViewer
-from models.predict import predict_changes
+from .tiled_viewer import TiledImageViewer
+from .worker import PredictionWorker, TaskWorker, warm_model
+from models.raster import open_raster
+from models.radiometry import Scaling
+from models.mask_io import mask_from_probabilities, resize_probabilities, save_mask
+from models.probability_cache import probability_cache
+from models.geo import read_georeference
+
+STAGE_RANGES = {
+    "load": (0, 10),
+    "preprocess": (10, 20),
+    "forward": (20, 90),
+    "postprocess": (90, 95),
+    "save": (95, 100),
+}
+
+STAGE_NAMES = {
+    "load": "加载模型",
+    "preprocess": "预处理",
+    "forward": "推理",
+    "postprocess": "后处理",
+    "save": "保存结果",
+}
 
 class BuildingChangeDetectionApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.app_dir = os.path.dirname(os.path.dirname(sys.executable))
-        self.output_dir = os.path.join(self.app_dir, "result")
         self.default_model_path = os.path.join(self.app_dir, "model", "model.pth")
         
-        os.makedirs(self.output_dir, exist_ok=True)
+        self.worker = None
+        self.export_worker = None
+        self.warm_worker = None
+        self.profiler = None
         
         self.initUI()
         
@@ -25,6 +49,16 @@ class BuildingChangeDetectionApp(QMainWindow):
             'before': None,
             'after': None
         }
+        # Decoded image handles, shared by the viewers and the detector
+        self.images = {
+            'before': None,
+            'after': None
+        }
+        self.result_mask = None
+        # Probability map of the current pair at source resolution
+        self.probabilities = None
+        
+        QTimer.singleShot(0, self.warm_default_model)
         
         self.setStyleSheet("""
             QMainWindow {
@@ -152,6 +186,17 @@ class BuildingChangeDetectionApp(QMainWindow):
         after_layout.addWidget(self.after_path_label)
         image_layout.addLayout(after_layout)
         
+        scaling_layout = QFormLayout()
+        self.scaling_combo = QComboBox()
+        self.scaling_combo.addItem("最小-最大值", Scaling("minmax"))
+        self.scaling_combo.addItem("百分比截断 (2%-98%)", Scaling("percentile", 2.0, 98.0))
+        self.scaling_combo.addItem("16位定标", Scaling("bitdepth", bit_depth=16))
+        self.scaling_combo.addItem("12位定标", Scaling("bitdepth", bit_depth=12))
+        self.scaling_combo.setToolTip("非8位影像（如16位TIFF）拉伸到0-255的方式，显示与检测使用同一结果")
+        self.scaling_combo.currentIndexChanged.connect(self.on_scaling_changed)
+        scaling_layout.addRow("影像拉伸:", self.scaling_combo)
+        image_layout.addLayout(scaling_layout)
+        
         left_layout.addWidget(image_group)
         
         model_group = QGroupBox("模型选择")
@@ -164,6 +209,11 @@ class BuildingChangeDetectionApp(QMainWindow):
         self.model_type.addItem("自定义模型", "")
         self.model_type.currentIndexChanged.connect(self.on_model_type_changed)
         model_type_layout.addRow("检测模型:", self.model_type)
+        self.precision_combo = QComboBox()
+        self.precision_combo.addItem("FP32", "fp32")
+        self.precision_combo.addItem("INT8 (CPU)", "int8")
+        self.precision_combo.setToolTip("INT8 需先运行 python -m models quantize 生成量化模型")
+        model_type_layout.addRow("推理精度:", self.precision_combo)
         model_layout.addLayout(model_type_layout)
         
         model_path_layout = QHBoxLayout()
@@ -182,6 +232,12 @@ class BuildingChangeDetectionApp(QMainWindow):
         model_path_layout.addWidget(self.model_browse_btn)
         
         model_layout.addLayout(model_path_layout)
+        
+        self.export_btn = QPushButton("导出优化模型")
+        self.export_btn.setToolTip("融合卷积与BN层，在权重文件旁生成 TorchScript/ONNX 模型，之后的检测将自动使用")
+        self.export_btn.clicked.connect(self.export_model)
+        self.export_btn.setEnabled(False)
+        model_layout.addWidget(self.export_btn)
         left_layout.addWidget(model_group)
         
         analysis_group = QGroupBox("变化检测")
@@ -197,6 +253,34 @@ class BuildingChangeDetectionApp(QMainWindow):
         self.analyze_btn.setEnabled(False)
         analysis_layout.addWidget(self.analyze_btn)
         
+        self.cancel_btn = QPushButton('取消')
+        self.cancel_btn.clicked.connect(self.cancel_analysis)
+        self.cancel_btn.setEnabled(False)
+        analysis_layout.addWidget(self.cancel_btn)
+        
+        tile_layout = QFormLayout()
+        self.tiled_check = QCheckBox("原始分辨率分块推理")
+        self.tiled_check.setToolTip("按滑动窗口分块推理，输出与输入图像尺寸一致")
+        tile_layout.addRow(self.tiled_check)
+        self.tile_size_spin = QSpinBox()
+        self.tile_size_spin.setRange(64, 2048)
+        self.tile_size_spin.setSingleStep(64)
+        self.tile_size_spin.setValue(256)
+        tile_layout.addRow("分块大小:", self.tile_size_spin)
+        analysis_layout.addLayout(tile_layout)
+        
+        threshold_layout = QHBoxLayout()
+        threshold_layout.addWidget(QLabel("变化阈值:"))
+        self.threshold_slider = QSlider(Qt.Horizontal)
+        self.threshold_slider.setRange(1, 99)
+        self.threshold_slider.setValue(50)
+        self.threshold_slider.setToolTip("调整后直接重新二值化当前结果，无需重新推理")
+        self.threshold_slider.valueChanged.connect(self.on_threshold_changed)
+        threshold_layout.addWidget(self.threshold_slider)
+        self.threshold_label = QLabel("0.50")
+        threshold_layout.addWidget(self.threshold_label)
+        analysis_layout.addLayout(threshold_layout)
+        
         progress_layout = QVBoxLayout()
         progress_layout.addWidget(QLabel("检测进度:"))
         self.progress_bar = QProgressBar()
@@ -228,13 +312,13 @@ class BuildingChangeDetectionApp(QMainWindow):
         
         self.image_viewers = QTabWidget()
         
-        self.before_viewer = ImageViewer()
+        self.before_viewer = TiledImageViewer()
         self.image_viewers.addTab(self.before_viewer, '变化前图像')
         
-        self.after_viewer = ImageViewer()
+        self.after_viewer = TiledImageViewer()
         self.image_viewers.addTab(self.after_viewer, '变化后图像')
         
-        self.result_viewer = ImageViewer()
+        self.result_viewer = TiledImageViewer()
         self.image_viewers.addTab(self.result_viewer, '变化二值图')
         
         right_layout.addWidget(self.image_viewers)
@@ -245,15 +329,61 @@ class BuildingChangeDetectionApp(QMainWindow):
         self.statusBar = QStatusBar()
         self.setStatusBar(self.statusBar)
         self.statusBar.showMessage("准备就绪")
+        
+        debug_menu = self.menuBar().addMenu("调试")
+        self.profile_action = QAction("性能分析", self, checkable=True)
+        self.profile_action.setStatusTip("记录各网络层、各处理阶段及torch.cat的耗时，关闭时导出Chrome Trace")
+        self.profile_action.toggled.connect(self.on_profiling_toggled)
+        debug_menu.addAction(self.profile_action)
+
+    def warm_default_model(self):
+        if not os.path.exists(self.default_model_path):
+            return
+        self.statusBar.showMessage("正在后台加载默认模型...")
+        self.warm_worker = TaskWorker(warm_model, self.default_model_path, parent=self)
+        self.warm_worker.succeeded.connect(lambda _: self.statusBar.showMessage("准备就绪"))
+        self.warm_worker.failed.connect(
+            lambda message: self.statusBar.showMessage(f"默认模型加载失败: {message}"))
+        self.warm_worker.start()
 
     def on_model_type_changed(self, index):
         if index == 0: 
             self.model_path_edit.setEnabled(False)
             self.model_browse_btn.setEnabled(False)
+            self.export_btn.setEnabled(False)
             self.model_path_edit.setText("")
         else: 
             self.model_path_edit.setEnabled(True)
             self.model_browse_btn.setEnabled(True)
+            self.export_btn.setEnabled(self.export_worker is None)
+
+    def export_model(self):
+        model_path = self.get_model_path()
+        if not model_path or self.export_worker is not None:
+            return
+        
+        from models.export import export_model
+        
+        self.export_btn.setEnabled(False)
+        self.statusBar.showMessage("正在导出优化模型...")
+        self.export_worker = TaskWorker(export_model, model_path, parent=self)
+        self.export_worker.succeeded.connect(self.on_export_succeeded)
+        self.export_worker.failed.connect(self.on_export_failed)
+        self.export_worker.finished.connect(self.on_export_finished)
+        self.export_worker.start()
+
+    def on_export_succeeded(self, written):
+        paths = ", ".join(os.path.basename(info['path']) for info in written.values())
+        self.statusBar.showMessage(f"优化模型已导出: {paths}")
+
+    def on_export_failed(self, message):
+        QMessageBox.critical(self, 'Export Error', message)
+        self.statusBar.showMessage("导出出错")
+
+    def on_export_finished(self):
+        self.export_worker.deleteLater()
+        self.export_worker = None
+        self.export_btn.setEnabled(self.model_type.currentIndex() == 1)
 
     def browse_model(self):
         file_path, _ = QFileDialog.getOpenFileName(
@@ -277,7 +407,9 @@ class BuildingChangeDetectionApp(QMainWindow):
             )
             
             if file_path:
+                raster = open_raster(file_path, scaling=self.scaling_combo.currentData())
                 self.image_paths[image_type] = file_path
+                self.images[image_type] = raster
                 
                 path_label = self.before_path_label if image_type == 'before' else self.after_path_label
                 file_name = os.path.basename(file_path)
@@ -285,7 +417,7 @@ class BuildingChangeDetectionApp(QMainWindow):
                 path_label.setToolTip(file_path)
                 
                 viewer = self.before_viewer if image_type == 'before' else self.after_viewer
-                viewer.load_image(file_path)
+                viewer.load_image(raster)
                 
                 self.analyze_btn.setEnabled(
                     self.image_paths['before'] is not None and 
@@ -299,6 +431,18 @@ class BuildingChangeDetectionApp(QMainWindow):
             QMessageBox.critical(self, 'Error', f"Failed to load image: {str(e)}")
             self.statusBar.showMessage(f"Error loading {image_type} image")
 
+    def on_scaling_changed(self, index):
+        scaling = self.scaling_combo.itemData(index)
+        for image_type, viewer in (('before', self.before_viewer), ('after', self.after_viewer)):
+            file_path = self.image_paths[image_type]
+            if file_path is None:
+                continue
+            try:
+                self.images[image_type] = open_raster(file_path, scaling=scaling)
+                viewer.load_image(self.images[image_type])
+            except Exception as e:
+                QMessageBox.critical(self, 'Error', f"Failed to load image: {str(e)}")
+
     def get_model_path(self):
         if self.model_type.currentIndex() == 0:
             return self.default_model_path
@@ -313,49 +457,147 @@ class BuildingChangeDetectionApp(QMainWindow):
             return custom_path
 
     def analyze_changes(self):
+        if self.worker is not None:
+            return
+        
+        if not all(self.image_paths.values()):
+            QMessageBox.warning(self, 'Error', '请上传变化前后图像')
+            return
+        
+        model_path = self.get_model_path()
+        if not model_path:
+            return
+        
+        options = {'precision': self.precision_combo.currentData(), 'cache': probability_cache}
+        if options['precision'] == 'int8':
+            options['device'] = 'cpu'
+        if self.tiled_check.isChecked():
+            options['tile_size'] = self.tile_size_spin.value()
+        
+        self.statusBar.showMessage("检测中...")
+        self.progress_bar.setMaximum(100)
+        self.progress_bar.setValue(0)
+        self.analyze_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        
+        self.worker = PredictionWorker(
+            self.images['before'],
+            self.images['after'],
+            model_path,
+            options=options,
+            parent=self
+        )
+        self.worker.progress.connect(self.on_analysis_progress)
+        self.worker.succeeded.connect(self.on_analysis_succeeded)
+        self.worker.failed.connect(self.on_analysis_failed)
+        self.worker.cancelled.connect(self.on_analysis_cancelled)
+        self.worker.finished.connect(self.on_analysis_finished)
+        self.worker.start()
+
+    def cancel_analysis(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.statusBar.showMessage("正在取消...")
+
+    def on_analysis_progress(self, stage, done, total):
+        low, high = STAGE_RANGES.get(stage, (0, 100))
+        fraction = done / total if total else 1.0
+        self.progress_bar.setValue(int(low + (high - low) * fraction))
+        message = f"检测中: {STAGE_NAMES.get(stage, stage)}"
+        if stage == "forward" and total > 1:
+            message += f" ({done}/{total})"
+        self.statusBar.showMessage(message)
+
+    def threshold(self):
+        return self.threshold_slider.value() / 100
+
+    def on_threshold_changed(self, value):
+        self.threshold_label.setText(f"{self.threshold():.2f}")
+        if self.probabilities is None:
+            return
+        self.result_mask = mask_from_probabilities(self.probabilities, self.threshold())
+        self.result_viewer.load_image(self.result_mask, keep_view=True)
+
+    def on_analysis_succeeded(self, result):
         try:
-            if not all(self.image_paths.values()):
-                QMessageBox.warning(self, 'Error', '请上传变化前后图像')
-                return
-            
-            model_path = self.get_model_path()
-            if not model_path:
-                return
-                
-            self.statusBar.showMessage("检测中...")
-            self.progress_bar.setValue(0)
-            self.progress_bar.setMaximum(0) 
-            
-            output_path = os.path.join(self.output_dir, "result_image.png")
-            
-            try:
-                result_image = predict_changes(
-                    self.image_paths['before'], 
-                    self.image_paths['after'],
-                    model_path=model_path,
-                    output_path=output_path
-                )
-                
-                self.result_viewer.load_image(output_path)
-                self.image_viewers.setCurrentIndex(2)
-                self.save_results_btn.setEnabled(True)
-                
-                self.statusBar.showMessage("分析完毕！")
-                
-            except Exception as e:
-                QMessageBox.critical(self, 'Prediction Error', str(e))
-                self.statusBar.showMessage("Error during analysis")
-            
-            self.progress_bar.setMaximum(100)
+            # Upsampled once so the threshold slider only has to re-threshold
+            self.probabilities = resize_probabilities(*result)
+            self.result_mask = mask_from_probabilities(self.probabilities, self.threshold())
+            self.result_viewer.load_image(self.result_mask)
+            self.image_viewers.setCurrentIndex(2)
+            self.save_results_btn.setEnabled(True)
             self.progress_bar.setValue(100)
-            
+            self.statusBar.showMessage("分析完毕！")
         except Exception as e:
             QMessageBox.critical(self, 'Error', str(e))
-            self.progress_bar.setMaximum(100)
             self.statusBar.showMessage("Error during analysis")
 
+    def on_analysis_failed(self, message):
+        QMessageBox.critical(self, 'Prediction Error', message)
+        self.progress_bar.setValue(0)
+        self.statusBar.showMessage("Error during analysis")
+
+    def on_analysis_cancelled(self):
+        self.progress_bar.setValue(0)
+        self.statusBar.showMessage("检测已取消")
+
+    def on_analysis_finished(self):
+        self.worker.deleteLater()
+        self.worker = None
+        self.cancel_btn.setEnabled(False)
+        self.analyze_btn.setEnabled(all(self.image_paths.values()))
+
+    def on_profiling_toggled(self, enabled):
+        # Imported on first use: the profiler pulls in torch
+        from models.profiling import Profiler
+        
+        if enabled:
+            self.profiler = Profiler().start()
+            self.statusBar.showMessage("性能分析已开启，之后的检测将被记录")
+            return
+        
+        profiler, self.profiler = self.profiler, None
+        profiler.stop()
+        if not profiler.events:
+            self.statusBar.showMessage("性能分析已关闭，没有记录")
+            return
+        
+        save_path, _ = QFileDialog.getSaveFileName(
+            self,
+            'Save Trace',
+            os.path.join(QDir.homePath(), 'profile_trace.json'),
+            'Chrome Trace (*.json)'
+        )
+        if save_path:
+            try:
+                profiler.write_trace(save_path)
+                self.statusBar.showMessage(f"性能记录已保存至 {save_path}")
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to save trace: {str(e)}")
+        
+        box = QMessageBox(self)
+        box.setWindowTitle("性能分析")
+        box.setText("各阶段与网络层耗时（展开详情查看）")
+        box.setDetailedText(profiler.format_summary())
+        box.exec_()
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+        if self.export_worker is not None:
+            self.export_worker.wait()
+        if self.warm_worker is not None:
+            self.warm_worker.wait()
+        for viewer in (self.before_viewer, self.after_viewer, self.result_viewer):
+            viewer.wait_for_loaders()
+        if self.profiler is not None:
+            self.profiler.stop()
+        super().closeEvent(event)
+
     def save_results(self):
-        if not os.path.exists(os.path.join(self.output_dir, "result_image.png")):
+        if self.result_mask is None:
             QMessageBox.warning(self, "Warning", "无检测结果，请先进行检测。")
             return
             
@@ -363,16 +605,13 @@ class BuildingChangeDetectionApp(QMainWindow):
             self, 
             'Save Results', 
             os.path.join(QDir.homePath(), 'building_change_result.png'), 
-            'PNG Image (*.png)'
+            'PNG Image (*.png);;GeoTIFF Image (*.tif *.tiff);;GeoJSON Polygons (*.geojson);;Run-length JSON (*.rle)'
         )
         
         if save_path:
             try:
-                import shutil
-                shutil.copy(
-                    os.path.join(self.output_dir, "result_image.png"),
-                    save_path
-                )
+                georef = read_georeference(self.images['before'])
+                save_mask(self.result_mask, save_path, self.threshold(), georef)
                 self.statusBar.showMessage(f"结果已保存至 {save_path}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save results: {str(e)}")
@@ -0,0 +1,303 @@
+import math
+from collections import OrderedDict
+import cv2
+import numpy as np
+from PyQt5.QtWidgets import (QGraphicsView, QGraphicsScene, QGraphicsItem,
+                             QGraphicsSimpleTextItem, QSizePolicy, QFrame)
+from PyQt5.QtGui import QImage, QPixmap, QFont, QPainter, QColor, QBrush, QTransform
+from PyQt5.QtCore import Qt, QRectF, QTimer
+
+from models.raster import open_raster
+from .worker import TaskWorker
+
+TILE_SIZE = 256
+TILE_CACHE_SIZE = 512
+OVERVIEW_PIXEL_LIMIT = 4096 * 4096
+MIN_ZOOM = 0.1
+MAX_ZOOM = 16.0
+SMOOTH_DELAY_MS = 150
+
+
+def wrap_image(image):
+    # QImage shares the numpy buffer, so the caller must keep the array alive
+    h, w = image.shape[:2]
+    
+    if len(image.shape) == 2:
+        qt_format = QImage.Format_Grayscale8
+    elif image.shape[2] == 3:
+        qt_format = QImage.Format_RGB888
+    elif image.shape[2] == 4:
+        qt_format = QImage.Format_RGBA8888
+    else:
+        raise ValueError(f"Unsupported image format with {image.shape[2]} channels")
+    
+    return QImage(image.data, w, h, image.strides[0], qt_format)
+
+
+def max_level(shape, tile_size=TILE_SIZE):
+    h, w = shape[:2]
+    return max(0, math.ceil(math.log2(max(w, h) / tile_size)))
+
+
+def view_level(shape, lod, tile_size=TILE_SIZE):
+    # Pyramid level drawn at a level of detail (view pixels per image pixel)
+    return 0 if lod >= 1 else min(max_level(shape, tile_size), int(math.floor(math.log2(1 / lod))))
+
+
+def prepare_overviews(raster, level, tile_size=TILE_SIZE):
+    # Runs on a worker thread: the scene-wide stretch and every overview from level up,
+    # so the first paint of a large or non-8-bit raster does not scan it on the GUI thread.
+    # Coarser levels are area-averaged from the finer one instead of re-reading the scene.
+    if raster.dtype != np.uint8:
+        raster.value_range()
+    overviews = {}
+    previous = None
+    for index in range(max(1, level), max_level(raster.shape, tile_size) + 1):
+        h, w = raster.overview_size(2 ** index)
+        if h * w > OVERVIEW_PIXEL_LIMIT:
+            overviews[index] = None
+        elif previous is None:
+            overviews[index] = previous = raster.read_overview(2 ** index)
+        else:
+            overviews[index] = previous = cv2.resize(previous, (w, h), interpolation=cv2.INTER_AREA)
+    return overviews
+
+
+class TiledImageItem(QGraphicsItem):
+    def __init__(self, raster, tile_size=TILE_SIZE, cache_size=TILE_CACHE_SIZE, overviews=None):
+        super().__init__()
+        self.raster = raster
+        self.tile_size = tile_size
+        self.cache_size = cache_size
+        self._overviews = dict(overviews or {})
+        self._tiles = OrderedDict()
+        # Cleared while the view is zooming or resizing, so those repaints skip filtering
+        self.smooth = True
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self):
+        h, w = self.raster.shape[:2]
+        return QRectF(0, 0, w, h)
+
+    def _overview(self, level):
+        # Coarse levels are read once as a whole; fine levels that would be too
+        # large are produced per tile from a full-resolution window instead.
+        if level not in self._overviews:
+            h, w = self.raster.overview_size(2 ** level)
+            self._overviews[level] = self.raster.read_overview(2 ** level) if h * w <= OVERVIEW_PIXEL_LIMIT else None
+        return self._overviews[level]
+
+    def _read_tile(self, level, tx, ty):
+        t = self.tile_size
+        if level == 0:
+            h, w = self.raster.shape[:2]
+            return self.raster.read_window(ty * t, min(h, (ty + 1) * t), tx * t, min(w, (tx + 1) * t))
+
+        overview = self._overview(level)
+        if overview is not None:
+            return np.ascontiguousarray(overview[ty * t:(ty + 1) * t, tx * t:(tx + 1) * t])
+
+        factor = 2 ** level
+        h, w = self.raster.shape[:2]
+        y0, x0 = ty * t * factor, tx * t * factor
+        y1, x1 = min(h, y0 + t * factor), min(w, x0 + t * factor)
+        region = self.raster.read_window(y0, y1, x0, x1)
+        size = (math.ceil((x1 - x0) / factor), math.ceil((y1 - y0) / factor))
+        return cv2.resize(region, size, interpolation=cv2.INTER_AREA)
+
+    def _tile(self, level, tx, ty):
+        key = (level, tx, ty)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            return pixmap
+
+        pixmap = QPixmap.fromImage(wrap_image(self._read_tile(level, tx, ty)))
+        self._tiles[key] = pixmap
+        while len(self._tiles) > self.cache_size:
+            self._tiles.popitem(last=False)
+        return pixmap
+
+    def paint(self, painter, option, widget=None):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = view_level(self.raster.shape, lod, self.tile_size)
+        scale = 2 ** level
+        level_h, level_w = self.raster.overview_size(scale)
+        t = self.tile_size
+
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        x0 = max(0, int(exposed.left() / scale) // t)
+        y0 = max(0, int(exposed.top() / scale) // t)
+        x1 = min((level_w - 1) // t, int(exposed.right() / scale) // t)
+        y1 = min((level_h - 1) // t, int(exposed.bottom() / scale) // t)
+
+        painter.setClipRect(self.boundingRect())
+        # Nearest-neighbour when zoomed in so individual mask pixels stay crisp
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, lod < 1 and self.smooth)
+        for ty in range(y0, y1 + 1):
+            for tx in range(x0, x1 + 1):
+                pixmap = self._tile(level, tx, ty)
+                target = QRectF(tx * t * scale, ty * t * scale, pixmap.width() * scale, pixmap.height() * scale)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
+
+class TiledImageViewer(QGraphicsView):
+    def __init__(self):
+        super().__init__()
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setStyleSheet("""
+            QGraphicsView {
+                background-color: #f8f9fa;
+                border: 2px dashed #dadce0;
+                border-radius: 6px;
+            }
+        """)
+        self.setMinimumSize(400, 400)
+        self.setFrameShape(QFrame.NoFrame)
+        self.setBackgroundBrush(QBrush(QColor("#f8f9fa")))
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
+        self.setAlignment(Qt.AlignCenter)
+
+        self._scene = QGraphicsScene(self)
+        self.setScene(self._scene)
+
+        self.current_image = None
+        self.image_item = None
+        self.zoom_level = 1.0
+        self.fit_to_view = True
+        self._loader = None
+        self._loaders = set()
+
+        # One smooth repaint once zooming or resizing has been idle for SMOOTH_DELAY_MS
+        self._smooth_timer = QTimer(self)
+        self._smooth_timer.setSingleShot(True)
+        self._smooth_timer.setInterval(SMOOTH_DELAY_MS)
+        self._smooth_timer.timeout.connect(self._repaint_smooth)
+
+        self._show_message("无图像")
+
+    def _show_message(self, text):
+        self._scene.clear()
+        self.image_item = None
+        item = QGraphicsSimpleTextItem(text)
+        item.setFont(QFont("Times New Roman", 12))
+        item.setBrush(QBrush(QColor("#5f6368")))
+        self._scene.addItem(item)
+        self._scene.setSceneRect(item.boundingRect())
+        self.resetTransform()
+
+    def load_image(self, image_path, keep_view=False):
+        try:
+            raster = open_raster(image_path)
+            self._loader = None
+            if raster.dtype == np.uint8 and not getattr(raster, "lazy", True):
+                self._show_raster(raster, keep_view)
+                return
+
+            # The stretch and overviews of memory-mapped or non-8-bit rasters are read on a
+            # worker thread; a placeholder is shown until they are ready
+            self.current_image = None
+            self._show_message("正在加载影像...")
+            level = view_level(raster.shape, self._fit_scale(raster.shape))
+            loader = TaskWorker(prepare_overviews, raster, level, parent=self)
+            loader.succeeded.connect(lambda overviews: self._on_loaded(loader, raster, overviews))
+            loader.failed.connect(lambda error: self._on_load_failed(loader, error))
+            loader.finished.connect(lambda: self._on_loader_finished(loader))
+            self._loader = loader
+            self._loaders.add(loader)
+            loader.start()
+            
+        except Exception as e:
+            print(f"Error in load_image: {str(e)}")
+            self.current_image = None
+            self._show_message(f"Error loading image: {str(e)}")
+            raise
+
+    def _show_raster(self, raster, keep_view=False, overviews=None):
+        # Swapping in an image of the same size keeps the current zoom and scroll position
+        keep_view = keep_view and self.current_image is not None and self.current_image.shape == raster.shape
+
+        self._scene.clear()
+        self.current_image = raster
+        self.image_item = TiledImageItem(raster, overviews=overviews)
+        self._scene.addItem(self.image_item)
+        self._scene.setSceneRect(self.image_item.boundingRect())
+
+        if not keep_view:
+            self.fit_to_view = True
+            self._apply_zoom()
+
+    def _on_loaded(self, loader, raster, overviews):
+        # Results of a load that a newer image has replaced are dropped
+        if loader is self._loader:
+            self._loader = None
+            self._show_raster(raster, overviews=overviews)
+
+    def _on_load_failed(self, loader, error):
+        if loader is self._loader:
+            self._loader = None
+            print(f"Error in load_image: {error}")
+            self._show_message(f"Error loading image: {error}")
+
+    def _on_loader_finished(self, loader):
+        self._loaders.discard(loader)
+        loader.deleteLater()
+
+    def wait_for_loaders(self):
+        # Called before the window closes, as a QThread must not be destroyed while running
+        self._loader = None
+        for loader in list(self._loaders):
+            loader.wait()
+
+    def _defer_smooth(self):
+        if self.image_item is not None:
+            self.image_item.smooth = False
+            self._smooth_timer.start()
+
+    def _repaint_smooth(self):
+        if self.image_item is not None:
+            self.image_item.smooth = True
+            self.viewport().update()
+
+    def _fit_scale(self, shape=None):
+        h, w = (shape or self.current_image.shape)[:2]
+        viewport = self.viewport().rect()
+        return min((viewport.width() - 10) / w, (viewport.height() - 10) / h)
+
+    def _apply_zoom(self):
+        if self.current_image is None:
+            return
+        if self.fit_to_view:
+            self.zoom_level = self._fit_scale()
+        self.setTransform(QTransform.fromScale(self.zoom_level, self.zoom_level))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.fit_to_view:
+            self._defer_smooth()
+            self._apply_zoom()
+
+    def wheelEvent(self, event):
+        if self.current_image is None:
+            return
+        
+        delta = event.angleDelta().y()
+        factor = 1.1 if delta > 0 else 0.9
+        
+        min_zoom = min(MIN_ZOOM, self._fit_scale())
+        zoom_level = max(min_zoom, min(MAX_ZOOM, self.zoom_level * factor))
+        factor = zoom_level / self.zoom_level
+        self.zoom_level = zoom_level
+        self.fit_to_view = False
+        
+        self._defer_smooth()
+        self.scale(factor, factor)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MiddleButton and self.current_image is not None:
+            self.fit_to_view = True
+            self._apply_zoom()
+            return
+        super().mousePressEvent(event)
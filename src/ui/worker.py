@@ -0,0 +1,63 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from models.progress import PredictionCancelled
+
+
+def warm_model(model_path):
+    # Imports torch and loads the weights off the GUI thread
+    from models.registry import model_registry
+
+    model_registry.get(model_path)
+
+
+class PredictionWorker(QThread):
+    progress = pyqtSignal(str, int, int)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, before, after, model_path, options=None, parent=None):
+        super().__init__(parent)
+        self.before = before
+        self.after = after
+        self.model_path = model_path
+        self.options = options or {}
+
+    def run(self):
+        try:
+            from models.predict import predict_probability_map
+
+            # Emits (probability map, source size); thresholding is left to the caller
+            result = predict_probability_map(
+                self.before,
+                self.after,
+                model_path=self.model_path,
+                progress_callback=self.progress.emit,
+                cancel_check=self.isInterruptionRequested,
+                **self.options
+            )
+            self.succeeded.emit(result)
+        except PredictionCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def cancel(self):
+        self.requestInterruption()
+
+
+class TaskWorker(QThread):
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, fn, *args, parent=None, **kwargs):
+        super().__init__(parent)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        try:
+            self.succeeded.emit(self.fn(*self.args, **self.kwargs))
+        except Exception as e:
+            self.failed.emit(str(e))
@@ -0,0 +1,39 @@
+import cv2
+import numpy as np
+import pytest
+import torch
+from models.change_detection_model import SNUNet_ECAM
+
+
+@pytest.fixture(scope="session")
+def model():
+    torch.manual_seed(0)
+    return SNUNet_ECAM(in_ch=3, out_ch=1).eval()
+
+
+@pytest.fixture(scope="session")
+def model_path(model, tmp_path_factory):
+    path = tmp_path_factory.mktemp("weights") / "model.pth"
+    torch.save(model.state_dict(), path)
+    return str(path)
+
+
+@pytest.fixture
+def image_pair():
+    rng = np.random.default_rng(0)
+    return (rng.integers(0, 256, (64, 64, 3), dtype=np.uint8),
+            rng.integers(0, 256, (64, 64, 3), dtype=np.uint8))
+
+
+@pytest.fixture
+def pair_files(tmp_path):
+    # Three tiny before/after PNG pairs as (name, before_path, after_path)
+    rng = np.random.default_rng(0)
+    pairs = []
+    for i in range(3):
+        name = f"tile{i}"
+        paths = [str(tmp_path / f"{name}_{side}.png") for side in ("before", "after")]
+        for path in paths:
+            cv2.imwrite(path, rng.integers(0, 256, (40, 32, 3), dtype=np.uint8))
+        pairs.append((name, *paths))
+    return pairs
@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+from PIL import Image
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+# Runs the CLI in a fresh interpreter and reports whether any PyQt5 module got imported
+RUNNER = ("import json, sys\n"
+          "from models.cli import main\n"
+          "code = main(sys.argv[1:])\n"
+          "print(json.dumps({'code': code, 'qt': any(m.split('.')[0] == 'PyQt5' for m in sys.modules)}))\n")
+
+
+def run_cli(*args):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    result = subprocess.run([sys.executable, "-c", RUNNER] + [str(a) for a in args], env=env,
+                            capture_output=True, text=True, timeout=600)
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.strip().splitlines()
+    return json.loads(lines[-1]), "\n".join(lines[:-1])
+
+
+def write_pairs(root, names, extra_before=()):
+    rng = np.random.default_rng(0)
+    for side in ("before", "after"):
+        os.makedirs(root / side, exist_ok=True)
+        for name in list(names) + (list(extra_before) if side == "before" else []):
+            Image.fromarray(rng.integers(0, 256, (32, 40, 3), dtype=np.uint8)).save(root / side / f"{name}.png")
+
+
+def test_batch_pairs_by_name_without_qt(model_path, tmp_path):
+    write_pairs(tmp_path, ["a", "b"], extra_before=["lonely"])
+    status, output = run_cli("batch", "--before", tmp_path / "before", "--after", tmp_path / "after",
+                             "--output", tmp_path / "masks", "--model", model_path,
+                             "--cache-dir", tmp_path / "cache")
+    assert status == {"code": 0, "qt": False}
+    assert "lonely" in output
+    assert sorted(os.listdir(tmp_path / "masks")) == ["a.png", "b.png"]
+    for name in ("a", "b"):
+        assert Image.open(tmp_path / "masks" / f"{name}.png").size == (40, 32)
+
+
+def test_workers_reject_pipeline_only_flags(model_path, tmp_path):
+    write_pairs(tmp_path, ["a"])
+    status, output = run_cli("batch", "--before", tmp_path / "before", "--after", tmp_path / "after",
+                             "--output", tmp_path / "masks", "--model", model_path,
+                             "--workers", "2", "--cache-dir", tmp_path / "cache", "--queue-size", "4")
+    assert status["code"] == 1
+    assert "--cache-dir, --queue-size cannot be combined with --workers" in output
+    assert not os.path.exists(tmp_path / "masks")
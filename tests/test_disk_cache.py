@@ -0,0 +1,30 @@
+import os
+import time
+from models.disk_cache import DiskIndex, atomic_write
+
+
+def _write(path, size):
+    atomic_write(str(path), lambda f: f.write(b"x" * size))
+
+
+def test_index_tracks_total_and_evicts_least_recent(tmp_path):
+    index = DiskIndex(str(tmp_path), ".bin")
+    paths = [str(tmp_path / scope / f"{i}.bin") for i, scope in enumerate(["a", "a", "b"])]
+    for path in paths:
+        _write(path, 100)
+        index.add(path)
+        time.sleep(0.01)
+    assert index.total() == 300
+    index.touch(paths[0])
+
+    # The oldest file outside scope b goes first; scope b is kept even when it is oldest
+    assert index.evict(250, keep=lambda path: os.path.basename(os.path.dirname(path)) == "b")
+    assert not os.path.exists(paths[1])
+    assert index.total() == 200
+    assert not index.evict(150, incoming=100, keep=lambda path: True)
+
+    fresh = DiskIndex(str(tmp_path), ".bin")
+    assert fresh.total() == 200
+    assert paths[0] in fresh and paths[2] in fresh
+    fresh.clear()
+    assert fresh.total() == 0 and not os.path.exists(paths[0])
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from models import geo
+from models.geo import (GEO_KEY_DIRECTORY, MODEL_PIXEL_SCALE, MODEL_TIEPOINT, PROJECTED_CS_TYPE_KEY,
+                        read_georeference)
+from models.predict import predict_to_geotiff
+
+tifffile = pytest.importorskip("tifffile")
+
+
+def test_detect_keeps_crs_and_transform(model_path, image_pair, tmp_path):
+    extratags = [
+        (MODEL_PIXEL_SCALE, "d", 3, (10.0, 10.0, 0.0), True),
+        (MODEL_TIEPOINT, "d", 6, (0.0, 0.0, 0.0, 500000.0, 4000000.0, 0.0), True),
+        (GEO_KEY_DIRECTORY, "H", 8, (1, 1, 0, 1, PROJECTED_CS_TYPE_KEY, 0, 1, 32650), True),
+    ]
+    paths = []
+    for name, image in zip(("before.tif", "after.tif"), image_pair):
+        paths.append(str(tmp_path / name))
+        tifffile.imwrite(paths[-1], image, photometric="rgb", extratags=extratags)
+    output = str(tmp_path / "mask.tif")
+
+    mask, georef = predict_to_geotiff(*paths, output, model_path=model_path, device="cpu", tile_size=32,
+                                      overlap=8, keep_mask=True)
+    written = read_georeference(output)
+    assert written.crs == georef.crs == "EPSG:32650"
+    assert written.transform == georef.transform == (10.0, 0.0, 500000.0, 0.0, -10.0, 4000000.0)
+    assert np.array_equal(tifffile.imread(output) > 0, mask > 0)
+
+
+def _ring_area(ring):
+    points = np.asarray(ring)
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+
+
+def _polygon_area(polygon):
+    return _ring_area(polygon[0]) - sum(_ring_area(hole) for hole in polygon[1:])
+
+
+def _masks():
+    pixel = np.zeros((10, 10), dtype=np.uint8)
+    pixel[2, 2] = 255
+    line = np.zeros((10, 10), dtype=np.uint8)
+    line[4, 1:8] = 255
+    square = np.zeros((10, 10), dtype=np.uint8)
+    square[2:8, 2:8] = 255
+    square[4:6, 4:6] = 0
+    return {"pixel": pixel, "line": line, "square": square}
+
+
+@pytest.mark.parametrize("backend", ["rasterio", "contours"])
+@pytest.mark.parametrize("name", ["pixel", "line", "square"])
+def test_polygons_follow_pixel_edges(name, backend, monkeypatch):
+    if backend == "contours":
+        monkeypatch.setattr(geo, "_import_rasterio", lambda: None)
+    elif geo._import_rasterio() is None:
+        pytest.skip("rasterio is not installed")
+    mask = _masks()[name]
+    features = geo.vectorize_mask(mask)
+    assert len(features) == 1
+    polygon = features[0]["geometry"]["coordinates"]
+    assert features[0]["geometry"]["type"] == "Polygon"
+    for ring in polygon:
+        assert ring[0] == ring[-1]
+        assert len(ring) >= 5
+    assert len(polygon) == (2 if name == "square" else 1)
+    assert _polygon_area(polygon) == features[0]["properties"]["pixels"] == np.count_nonzero(mask)
@@ -0,0 +1,27 @@
+import io
+import json
+import numpy as np
+from PIL import Image
+from models.mask_io import decode_rle, encode_mask, encode_rle
+
+
+def _mask():
+    rng = np.random.default_rng(0)
+    mask = np.where(rng.random((37, 53)) > 0.7, 255, 0).astype(np.uint8)
+    mask[0, 0] = 255
+    return mask
+
+
+def test_rle_round_trip():
+    mask = _mask()
+    assert np.array_equal(decode_rle(encode_rle(mask), mask.shape), mask)
+    data = json.loads(encode_mask(mask, ".rle", 0.5))
+    assert data["threshold"] == 0.5
+    assert np.array_equal(decode_rle(data["counts"], data["size"]), mask)
+
+
+def test_png_round_trip_is_one_bit():
+    mask = _mask()
+    image = Image.open(io.BytesIO(encode_mask(mask, ".png", 0.5)))
+    assert image.mode == "1"
+    assert np.array_equal(np.asarray(image), mask > 0)
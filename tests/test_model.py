@@ -0,0 +1,10 @@
+import torch
+from models.preprocess import to_input_tensor
+
+
+def test_shared_encoder_matches_separate_passes(model, image_pair):
+    xA, xB = (to_input_tensor(image) for image in image_pair)
+    with torch.no_grad():
+        shared = model(xA, xB)
+        separate = model.decode(model.encode(xA), model.encode(xB))
+    assert torch.allclose(shared, separate, atol=1e-5)
@@ -0,0 +1,21 @@
+from models.pipeline import run_pipeline
+from models.probability_cache import ProbabilityCache
+
+
+def test_second_run_is_all_cache_hits(model_path, pair_files, tmp_path):
+    pairs = pair_files
+    cache = ProbabilityCache(str(tmp_path / "cache"))
+    runs = []
+    for out in ("first", "second"):
+        lines = []
+        stats = run_pipeline(pairs, str(tmp_path / out), model_path=model_path, device="cpu", batch_size=2,
+                             img_size=64, cache=cache, log=lines.append)
+        assert stats["pairs"] == len(pairs) and not stats["failed"]
+        assert lines[-1].startswith(f"{len(pairs)}/{len(pairs)} pairs")
+        runs.append(stats)
+
+    assert runs[0]["cache_hits"] == 0
+    assert runs[1]["cache_hits"] == len(pairs)
+    for name, _, _ in pairs:
+        first = (tmp_path / "first" / f"{name}.png").read_bytes()
+        assert first == (tmp_path / "second" / f"{name}.png").read_bytes()
@@ -0,0 +1,21 @@
+import numpy as np
+from PIL import Image
+from models.pipeline import run_pipeline
+from models.pool import plan_workers, run_pool
+
+
+def test_plan_workers_splits_cores():
+    assert plan_workers(cores=[0, 1, 2, 3]) == (2, 2, [[0, 1], [2, 3]])
+    assert plan_workers(workers=3, threads=1, cores=[0, 1]) == (3, 1, [[0], [1], None])
+
+
+def test_two_spawned_workers_match_the_pipeline(model_path, pair_files, tmp_path):
+    pairs = pair_files
+    pooled = run_pool(pairs, str(tmp_path / "pool"), model_path=model_path, workers=2, threads=1,
+                      batch_size=2, img_size=64, log=lambda line: None)
+    run_pipeline(pairs, str(tmp_path / "single"), model_path=model_path, device="cpu", batch_size=2,
+                 img_size=64, log=lambda line: None)
+    assert pooled["pairs"] == len(pairs) and pooled["workers"] == 2
+    for name, _, _ in pairs:
+        mask = np.asarray(Image.open(tmp_path / "pool" / f"{name}.png"))
+        assert np.array_equal(mask, np.asarray(Image.open(tmp_path / "single" / f"{name}.png")))
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from models.mask_io import mask_from_probabilities, resize_probabilities
+from models.predict import predict_changes, predict_probability_map
+
+
+@pytest.mark.parametrize("tile_size", [None, 32])
+def test_rethresholding_matches_a_fresh_run(model_path, image_pair, tile_size):
+    imgA, imgB = image_pair
+    prob_map, size = predict_probability_map(imgA, imgB, model_path=model_path, device="cpu",
+                                             tile_size=tile_size, overlap=8)
+    probabilities = resize_probabilities(prob_map, size)
+    masks = []
+    # Thresholds between levels the map actually takes, so each one gives a different mask
+    levels = np.unique(probabilities)
+    for k in (1, 2, 3):
+        threshold = (levels[len(levels) * k // 4] + 0.5) / 255
+        fresh = predict_changes(imgA, imgB, model_path=model_path, device="cpu", tile_size=tile_size, overlap=8,
+                                threshold=threshold)
+        masks.append(mask_from_probabilities(probabilities, threshold))
+        assert np.array_equal(masks[-1], fresh)
+    assert len({mask.tobytes() for mask in masks}) == 3
@@ -0,0 +1,79 @@
+import numpy as np
+import torch
+from models.coarse import CoarseToFine
+from models.predict import predict_probability_map
+from models.preprocess import to_input_tensor
+from models.prescreen import TilePrescreen
+from models.probability_cache import quantize_probabilities
+from models.tiling import predict_tiled
+from models.timing import StageTimer
+
+
+def test_only_coarse_to_fine_has_a_refine_stage(model_path, image_pair):
+    imgA, imgB = image_pair
+    stages = {}
+    for name, screen in (("prescreen", TilePrescreen(0.5)), ("coarse", CoarseToFine(0.2, size=32))):
+        timer = StageTimer()
+        predict_probability_map(imgA, imgB, model_path=model_path, device="cpu", tile_size=32, overlap=8,
+                                prescreen=screen, timer=timer)
+        stages[name] = set(timer.totals)
+    assert "refine" not in stages["prescreen"] and "prescreen" in stages["prescreen"]
+    assert {"coarse", "refine"} <= stages["coarse"]
+
+
+def test_skipped_tiles_do_not_pull_down_their_neighbours(model):
+    rng = np.random.default_rng(1)
+    imgA = rng.integers(0, 256, (32, 96, 3), dtype=np.uint8)
+    imgB = imgA.copy()
+    imgB[:, 40:] = rng.integers(0, 256, (32, 56, 3), dtype=np.uint8)
+    # Tiles start at x = 0, 16, 32, 48, 64; only the first one is unchanged
+    screen = TilePrescreen(0.01)
+    screened = predict_tiled(model, imgA, imgB, tile_size=32, overlap=16, prescreen=screen)
+    full = predict_tiled(model, imgA, imgB, tile_size=32, overlap=16)
+    assert screen.skipped_windows == [(0, 32, 0, 32)]
+
+    # Pixels only the skipped tile covers read as no change
+    assert screened[:, :16].max() == 0
+    # Its overlap with the next tile comes from that tile alone, not a blend with a sentinel
+    with torch.no_grad():
+        tile = torch.sigmoid(model(to_input_tensor(imgA[:, 16:48]), to_input_tensor(imgB[:, 16:48])))[0, 0]
+    expected = quantize_probabilities(tile.numpy())[:, :16]
+    assert np.abs(screened[:, 16:32].astype(int) - expected).max() <= 1
+    # Beyond the skipped tile's reach the result is that of a full run
+    assert np.abs(screened[:, 32:].astype(int) - full[:, 32:]).max() <= 1
+
+
+def test_coarse_to_fine_refines_like_a_full_run(model):
+    rng = np.random.default_rng(2)
+    imgA = rng.integers(0, 256, (64, 96, 3), dtype=np.uint8)
+    imgB = rng.integers(0, 256, (64, 96, 3), dtype=np.uint8)
+    full = predict_tiled(model, imgA, imgB, tile_size=32, overlap=16)
+    windows = [(y, y + 32, x, x + 32) for y in (0, 16, 32) for x in (0, 16, 32, 48, 64)]
+
+    screen = CoarseToFine(0.0, size=32, margin=0)
+    screen.prepare(model, imgA, imgB, "cpu", StageTimer())
+    assert np.abs(predict_tiled(model, imgA, imgB, tile_size=32, overlap=16, prescreen=screen).astype(int)
+                  - full).max() <= 1
+    assert screen.skipped == 0 and screen.total == len(windows)
+
+    # Random weights saturate the coarse map, so the left half is marked unchanged by hand
+    screen.reset()
+    screen.prepare(model, imgA, imgB, "cpu", StageTimer())
+    screen.threshold = 0.5
+    screen.dilated = np.ones_like(screen.dilated)
+    screen.dilated[:, :screen.dilated.shape[1] // 2] = 0
+    screened = predict_tiled(model, imgA, imgB, tile_size=32, overlap=16, prescreen=screen)
+    skipped = set(screen.skipped_windows)
+    assert skipped == {(y, y + 32, x, x + 32) for y in (0, 16, 32) for x in (0, 16)}
+
+    refined_cover = np.zeros(full.shape, dtype=bool)
+    skipped_cover = np.zeros(full.shape, dtype=bool)
+    for window in windows:
+        y0, y1, x0, x1 = window
+        (skipped_cover if window in skipped else refined_cover)[y0:y1, x0:x1] = True
+    coarse = quantize_probabilities(torch.sigmoid(torch.from_numpy(screen.fill([(0, 96, 0, 96)], 96)[0, :64])).numpy())
+    assert refined_cover.any() and (skipped_cover & ~refined_cover).any()
+    # Refined pixels match the full run and pixels only skipped tiles cover show the coarse map
+    assert np.abs(screened[refined_cover].astype(int) - full[refined_cover]).max() <= 1
+    only_coarse = skipped_cover & ~refined_cover
+    assert np.abs(screened[only_coarse].astype(int) - coarse[only_coarse]).max() <= 1
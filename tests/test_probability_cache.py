@@ -0,0 +1,45 @@
+import shutil
+import numpy as np
+from models import predict
+from models.feature_cache import FeatureCache
+from models.predict import cache_config, predict_probability_map
+from models.probability_cache import ProbabilityCache
+
+
+def test_cache_hit_is_byte_identical(model_path, image_pair, tmp_path, monkeypatch):
+    cache = ProbabilityCache(str(tmp_path / "cache"))
+    imgA, imgB = image_pair
+    prob_map, size = predict_probability_map(imgA, imgB, model_path=model_path, device="cpu", cache=cache)
+
+    def no_model(*args, **kwargs):
+        raise AssertionError("the model ran on a cache hit")
+
+    monkeypatch.setattr(predict.model_registry, "get", no_model)
+    cached, cached_size = predict_probability_map(imgA, imgB, model_path=model_path, device="cpu", cache=cache)
+    assert cached_size == size
+    assert cached.dtype == prob_map.dtype == np.uint8
+    assert cached.tobytes() == prob_map.tobytes()
+
+
+def test_int8_key_follows_the_quantized_export(model_path, image_pair, tmp_path):
+    weights = tmp_path / "model.pth"
+    shutil.copy(model_path, weights)
+    int8_path = tmp_path / "model.int8.torchscript.pt"
+    cache = ProbabilityCache(str(tmp_path / "cache"))
+    imgA, imgB = image_pair
+
+    int8_path.write_bytes(b"first calibration")
+    fp32_key = cache.key_for(imgA, imgB, str(weights), "fp32")
+    first = cache.key_for(imgA, imgB, str(weights), "int8")
+    int8_path.write_bytes(b"recalibrated export")
+    second = cache.key_for(imgA, imgB, str(weights), "int8")
+    assert first != second
+    assert cache.key_for(imgA, imgB, str(weights), "fp32") == fp32_key
+
+
+def test_feature_cache_runs_are_keyed_apart(model_path, image_pair, tmp_path):
+    cache = ProbabilityCache(str(tmp_path / "cache"))
+    imgA, imgB = image_pair
+    plain = cache.key_for(imgA, imgB, model_path, **cache_config(256, 32, 8))
+    with_features = cache.key_for(imgA, imgB, model_path, **cache_config(256, 32, 8, features=FeatureCache()))
+    assert plain != with_features
@@ -0,0 +1,27 @@
+import pytest
+import torch
+from models import timing
+from models.preprocess import to_input_tensor
+from models.profiling import Profiler, profiling_active
+
+
+def test_profiler_unhooks_on_exit(model, image_pair):
+    xA, xB = (to_input_tensor(image) for image in image_pair)
+    cat = torch.cat
+    profiler = Profiler()
+    with pytest.raises(RuntimeError):
+        with profiler, torch.no_grad():
+            assert torch.cat is not cat and profiling_active()
+            with timing.StageTimer().stage("forward"):
+                model(xA, xB)
+            raise RuntimeError("stop mid-run")
+
+    assert torch.cat is cat
+    assert not profiling_active() and not profiler.active
+    categories = {event["cat"] for event in profiler.events}
+    assert {"module", "cat", "stage"} <= categories
+
+    recorded = len(profiler.events)
+    with torch.no_grad():
+        model(xA, xB)
+    assert len(profiler.events) == recorded
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from models import radiometry
+from models.radiometry import Scaling, iter_blocks, scale_to_uint8, value_range
+from models.raster import open_raster
+
+
+@pytest.fixture
+def scene16():
+    rng = np.random.default_rng(0)
+    return rng.integers(300, 9000, (70, 50, 3), dtype=np.uint16)
+
+
+def blocks_of(image):
+    return iter_blocks(lambda y0, y1: image[y0:y1], image.shape[0], image.shape[1])
+
+
+def reference_scale(image, low, high):
+    # The same float32 stretch as scale_to_uint8, applied to the whole array at once
+    scaled = (image.astype(np.float32) - np.float32(low)) * np.float32(255.0 / (high - low))
+    return np.rint(np.clip(scaled, 0, 255)).astype(np.uint8)
+
+
+def test_minmax_and_bitdepth_ranges(scene16, monkeypatch):
+    monkeypatch.setattr(radiometry, "STATS_BLOCK_VALUES", 500)
+    assert len(list(blocks_of(scene16))) > 1
+    assert value_range(blocks_of(scene16), scene16.dtype) == (float(scene16.min()), float(scene16.max()))
+    assert value_range(blocks_of(scene16), scene16.dtype, Scaling("bitdepth", bit_depth=12)) == (0.0, 4095.0)
+    assert value_range(iter([]), np.uint16) == (0.0, 0.0)
+
+
+def test_16bit_percentiles_are_exact(scene16, monkeypatch):
+    monkeypatch.setattr(radiometry, "STATS_BLOCK_VALUES", 500)
+    scaling = Scaling("percentile", low_percentile=2.0, high_percentile=98.0)
+    low, high = value_range(blocks_of(scene16), scene16.dtype, scaling)
+    assert (low, high) == tuple(float(v) for v in np.percentile(scene16, [2.0, 98.0], method="lower"))
+
+
+def test_float_percentiles_are_close(monkeypatch):
+    image = np.random.default_rng(1).normal(0.0, 1.0, (200, 100, 3)).astype(np.float32)
+    low, high = value_range(blocks_of(image), image.dtype, Scaling("percentile"))
+    expected = np.percentile(image, [2.0, 98.0])
+    assert np.allclose((low, high), expected, atol=0.05)
+
+
+def test_chunked_scaling_matches_a_whole_array_reference(scene16, monkeypatch):
+    monkeypatch.setattr(radiometry, "CHUNK_VALUES", 7 * 50 * 3)
+    low, high = 500.0, 8000.0
+    out = np.empty(scene16.shape, dtype=np.uint8)
+    assert scale_to_uint8(scene16, low, high, out) is out
+    assert np.array_equal(out, reference_scale(scene16, low, high))
+    assert not scale_to_uint8(scene16, 10.0, 10.0).any()
+
+
+def test_raster_windows_share_the_scene_range(scene16):
+    image = open_raster(scene16)
+    low, high = image.value_range()
+    window = image.read_window(20, 40, 10, 30)
+    assert np.array_equal(window, reference_scale(scene16[20:40, 10:30], low, high))
+    assert np.array_equal(image.read()[20:40, 10:30], window)
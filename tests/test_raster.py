@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+import pytest
+from models import raster
+from models.raster import ArrayRaster, load_raster, open_raster
+
+tifffile = pytest.importorskip("tifffile")
+
+
+@pytest.fixture
+def scene():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (96, 80, 3), dtype=np.uint8)
+
+
+def test_tiff_windows_are_read_lazily(scene, tmp_path):
+    path = str(tmp_path / "scene.tif")
+    tifffile.imwrite(path, scene)
+    image = load_raster(path)
+    assert image.lazy and isinstance(image.array, np.memmap)
+    assert image.shape == scene.shape
+    assert np.array_equal(image.read_window(10, 50, 5, 70), scene[10:50, 5:70])
+    out = np.empty((8, 8, 3), dtype=np.uint8)
+    assert image.read_window(0, 8, 72, 80, out) is out
+    assert np.array_equal(out, scene[:8, 72:])
+    image.close()
+
+
+def test_planar_tiff_is_read_bands_last(scene, tmp_path):
+    path = str(tmp_path / "planar.tif")
+    tifffile.imwrite(path, np.moveaxis(scene, -1, 0), photometric="rgb", planarconfig="separate")
+    image = load_raster(path)
+    assert image.shape == scene.shape
+    assert np.array_equal(image.read(), scene)
+    image.close()
+
+
+@pytest.mark.parametrize("factor", [2, 4])
+def test_banded_overview_matches_the_in_memory_resize(scene, tmp_path, monkeypatch, factor):
+    monkeypatch.setattr(raster, "OVERVIEW_BAND_ROWS", 3)
+    path = str(tmp_path / "scene.tif")
+    tifffile.imwrite(path, scene)
+    expected = cv2.resize(scene, (80 // factor, 96 // factor), interpolation=cv2.INTER_AREA)
+    image = load_raster(path)
+    assert image.overview_size(factor) == expected.shape[:2]
+    assert np.array_equal(image.read_overview(factor), expected)
+    image.close()
+    assert np.array_equal(ArrayRaster(None, scene).read_overview(factor), expected)
+
+
+def test_overview_size_rounds_up(scene):
+    image = open_raster(scene[:95, :79])
+    assert image.overview_size(4) == (24, 20)
+    assert image.read_overview(4).shape == (24, 20, 3)
+
+
+def test_grey_and_two_band_arrays_become_rgb(scene):
+    grey = scene[:, :, 0]
+    assert np.array_equal(open_raster(grey).read(), np.repeat(grey[:, :, None], 3, axis=2))
+    assert np.array_equal(open_raster(scene[:, :, :2]).read(), np.repeat(scene[:, :, :1], 3, axis=2))
+
+
+@pytest.mark.filterwarnings("ignore:Dataset has no geotransform")
+def test_context_manager_closes_the_dataset(scene, tmp_path, monkeypatch):
+    pytest.importorskip("rasterio")
+    monkeypatch.setattr(raster, "tifffile", None)
+    path = str(tmp_path / "scene.tif")
+    tifffile.imwrite(path, scene)
+    with load_raster(path) as image:
+        assert np.array_equal(image.read_window(4, 20, 8, 40), scene[4:20, 8:40])
+    assert image.dataset.closed
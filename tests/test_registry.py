@@ -0,0 +1,25 @@
+import os
+import shutil
+import torch
+from models.change_detection_model import SNUNet_ECAM
+from models.registry import ModelRegistry
+
+
+def test_registry_reloads_after_the_weights_change(model_path, tmp_path):
+    weights = str(tmp_path / "model.pth")
+    shutil.copy(model_path, weights)
+    registry = ModelRegistry()
+    first = registry.get(weights, "cpu", optimized=False)
+    assert registry.get(weights, "cpu", optimized=False) is first
+
+    torch.manual_seed(1)
+    torch.save(SNUNet_ECAM(in_ch=3, out_ch=1).state_dict(), weights)
+    stat = os.stat(weights)
+    os.utime(weights, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not registry.is_cached(weights, "cpu", optimized=False)
+
+    second = registry.get(weights, "cpu", optimized=False)
+    assert second is not first
+    assert len(registry) == 1
+    name, value = next(iter(second.state_dict().items()))
+    assert not torch.equal(value, first.state_dict()[name])
@@ -0,0 +1,78 @@
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import pytest
+from PIL import Image
+from models.server import DetectionServer, request_prediction
+
+
+@pytest.fixture
+def server(model_path):
+    # A wide batching window so concurrent requests land in one forward pass
+    server = DetectionServer(("127.0.0.1", 0), model_path=model_path, device="cpu", max_batch=4, max_latency=1.0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.close()
+    thread.join(10)
+
+
+@pytest.fixture
+def pair_paths(image_pair, tmp_path):
+    paths = []
+    for name, image in zip(("before.png", "after.png"), image_pair):
+        paths.append(str(tmp_path / name))
+        Image.fromarray(image).save(paths[-1])
+    return paths
+
+
+def _post(url, body, content_type="application/json"):
+    request = urllib.request.Request(url + "/predict", data=body, headers={"Content-Type": content_type})
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request, timeout=60)
+    return error.value.code, json.loads(error.value.read())
+
+
+def test_concurrent_requests_are_micro_batched(server, pair_paths):
+    server, url = server
+    masks = [None] * 4
+
+    def send(i):
+        masks[i] = np.asarray(Image.open(io.BytesIO(request_prediction(*pair_paths, url=url))))
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(len(masks))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(120)
+
+    assert all(mask is not None and mask.shape == (64, 64) for mask in masks)
+    assert all(np.array_equal(mask, masks[0]) for mask in masks)
+    with urllib.request.urlopen(url + "/metrics", timeout=10) as response:
+        metrics = json.loads(response.read())
+    assert metrics["requests"] == 4 and metrics["errors"] == 0
+    assert max(int(size) for size in metrics["batch_sizes"]) > 1
+
+
+def test_rejected_requests(server, pair_paths):
+    server, url = server
+    before, after = pair_paths
+    status, body = _post(url, json.dumps({"before": before, "after": after}).encode(), "text/plain")
+    assert status == 415
+    status, body = _post(url, json.dumps({"before": before, "after": after, "output": "/tmp/x.png"}).encode())
+    assert status == 400 and "output" in body["error"]
+    status, body = _post(url, json.dumps({"before": before}).encode())
+    assert status == 400 and "after" in body["error"]
+    status, body = _post(url, b"not json")
+    assert status == 400
+
+
+def test_close_without_serving(model_path):
+    server = DetectionServer(("127.0.0.1", 0), model_path=model_path, device="cpu")
+    closer = threading.Thread(target=server.close, daemon=True)
+    closer.start()
+    closer.join(10)
+    assert not closer.is_alive()
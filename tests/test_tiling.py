@@ -0,0 +1,15 @@
+import numpy as np
+import torch
+from models.preprocess import to_input_tensor
+from models.probability_cache import quantize_probabilities
+from models.tiling import predict_tiled
+
+
+def test_exact_size_tile_matches_direct_forward(model, image_pair):
+    imgA, imgB = image_pair
+    tiled = predict_tiled(model, imgA, imgB, tile_size=64, overlap=16)
+    with torch.no_grad():
+        direct = torch.sigmoid(model(to_input_tensor(imgA), to_input_tensor(imgB)))[0, 0].numpy()
+    assert tiled.dtype == np.uint8
+    assert tiled.shape == (64, 64)
+    assert np.abs(tiled.astype(int) - quantize_probabilities(direct)).max() <= 1